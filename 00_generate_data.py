@@ -4,20 +4,29 @@ Author: Marketing Analytics Project
 Description: Generate realistic multi-channel marketing funnel data for analysis
 """
 
+import argparse
+import os
+import re
+import shutil
+import time
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import random
 
-# Set seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+from funnel_generator import generate_funnel_chunks, generate_touchpoints, generate_user
+from funnel_data import (DATA_BASENAME, DATA_FORMATS, EVENTS_BASENAME, STAGE_COLUMNS, TOUCHPOINTS_BASENAME,
+                         write_funnel_data, write_partitions, clear_partitions, to_event_log, spill_events,
+                         merge_event_spills)
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
 NUM_USERS = 75000
+RANDOM_SEED = 42
+PARTITION_DIR = DATA_BASENAME             # One file set per cohort_month when streaming
+SHARD_SIZE = 250000                        # Users per independently seeded shard (vectorized mode)
 START_DATE = datetime(2024, 1, 1)
 END_DATE = datetime(2024, 10, 31)
 
@@ -41,6 +50,13 @@ DEVICE_CONVERSION = {
     'Tablet': 0.9
 }
 
+# Demographic segments
+AGE_GROUPS = ['18-24', '25-34', '35-44', '45-54', '55+']
+AGE_WEIGHTS = [0.15, 0.35, 0.25, 0.15, 0.10]
+
+LOCATIONS = ['Urban', 'Suburban', 'Rural']
+LOCATION_WEIGHTS = [0.50, 0.35, 0.15]
+
 # Funnel stage base conversion rates
 BASE_RATES = {
     'landing_to_signup': 0.40,
@@ -49,6 +65,48 @@ BASE_RATES = {
     'cart_to_purchase': 0.33
 }
 
+# Minutes between consecutive stages (uniform integer range, inclusive)
+STAGE_DELAY_MINUTES = {
+    'landing_to_signup': (1, 30),
+    'signup_to_product_view': (2, 45),
+    'product_view_to_cart': (3, 60),
+    'cart_to_purchase': (5, 90)
+}
+
+# Conversion probability adjustments
+TIME_IMPROVEMENT_PER_WEEK = 0.002   # Learning/optimization effect
+RANDOM_FACTOR_RANGE = (0.9, 1.1)
+MAX_CONVERSION_PROBABILITY = 0.95
+
+# Purchase value (lognormal mean, sigma)
+PURCHASE_VALUE_LOGNORMAL = (4.2, 0.6)
+
+# Marketing touchpoints before the landing session (--touchpoints)
+TOUCHPOINT_LOOKBACK_DAYS = 30
+MEAN_PRIOR_TOUCHES = {'no_purchase': 0.8, 'purchase': 1.6}
+
+# Configuration bundle handed to the vectorized engine (funnel_generator.py)
+GENERATOR_CONFIG = {
+    'start_date': START_DATE,
+    'end_date': END_DATE,
+    'channels': CHANNELS,
+    'devices': DEVICES,
+    'device_weights': DEVICE_WEIGHTS,
+    'device_conversion': DEVICE_CONVERSION,
+    'age_groups': AGE_GROUPS,
+    'age_weights': AGE_WEIGHTS,
+    'locations': LOCATIONS,
+    'location_weights': LOCATION_WEIGHTS,
+    'base_rates': BASE_RATES,
+    'stage_delay_minutes': STAGE_DELAY_MINUTES,
+    'time_improvement_per_week': TIME_IMPROVEMENT_PER_WEEK,
+    'random_factor_range': RANDOM_FACTOR_RANGE,
+    'max_conversion_probability': MAX_CONVERSION_PROBABILITY,
+    'purchase_value_lognormal': PURCHASE_VALUE_LOGNORMAL,
+    'touchpoint_lookback_days': TOUCHPOINT_LOOKBACK_DAYS,
+    'mean_prior_touches': MEAN_PRIOR_TOUCHES
+}
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -63,234 +121,413 @@ def generate_timestamp(start, end):
 def calculate_conversion_probability(base_rate, channel_mult, device_mult, cohort_week):
     """Calculate conversion probability with various factors"""
     # Add slight improvement over time (learning/optimization effect)
-    time_improvement = 1 + (cohort_week * 0.002)
+    time_improvement = 1 + (cohort_week * TIME_IMPROVEMENT_PER_WEEK)
 
     # Add some randomness
-    random_factor = np.random.uniform(0.9, 1.1)
+    random_factor = np.random.uniform(*RANDOM_FACTOR_RANGE)
 
     prob = base_rate * channel_mult * device_mult * time_improvement * random_factor
-    return min(prob, 0.95)  # Cap at 95%
-
-# ============================================================================
-# DATA GENERATION
-# ============================================================================
-
-print("="*80)
-print("MARKETING FUNNEL DATA GENERATION")
-print("="*80)
-print(f"\nGenerating {NUM_USERS:,} user sessions...")
-print(f"Date range: {START_DATE.date()} to {END_DATE.date()}")
-print(f"Channels: {len(CHANNELS)}")
-print(f"Devices: {len(DEVICES)}")
-
-# Generate base user sessions
-users_data = []
-
-for user_id in range(1, NUM_USERS + 1):
-    # Select channel
-    channel = random.choices(
-        list(CHANNELS.keys()), 
-        weights=[CHANNELS[ch]['weight'] for ch in CHANNELS.keys()]
-    )[0]
-
-    # Select device
-    device = random.choices(DEVICES, weights=DEVICE_WEIGHTS)[0]
-
-    # Generate landing timestamp
-    landing_timestamp = generate_timestamp(START_DATE, END_DATE)
-
-    # Calculate cohort week
-    cohort_week = (landing_timestamp - START_DATE).days // 7
-
-    # Demographics
-    age_group = random.choices(
-        ['18-24', '25-34', '35-44', '45-54', '55+'],
-        weights=[0.15, 0.35, 0.25, 0.15, 0.10]
-    )[0]
-
-    location = random.choices(
-        ['Urban', 'Suburban', 'Rural'],
-        weights=[0.50, 0.35, 0.15]
-    )[0]
-
-    # Get multipliers
-    channel_mult = CHANNELS[channel]['conversion_multiplier']
-    device_mult = DEVICE_CONVERSION[device]
-
-    users_data.append({
-        'user_id': f'U{user_id:06d}',
-        'channel': channel,
-        'device': device,
-        'age_group': age_group,
-        'location': location,
-        'landing_timestamp': landing_timestamp,
-        'cohort_week': cohort_week,
-        'channel_mult': channel_mult,
-        'device_mult': device_mult
-    })
-
-    if user_id % 10000 == 0:
-        print(f"  Generated {user_id:,} users...")
-
-users_df = pd.DataFrame(users_data)
-print(f"\n✓ Generated {len(users_df):,} user sessions")
-
-# Generate funnel progression
-print("\nGenerating funnel progression...")
-funnel_data = []
-
-for idx, user in users_df.iterrows():
-    user_journey = {
-        'user_id': user['user_id'],
-        'channel': user['channel'],
-        'device': user['device'],
-        'age_group': user['age_group'],
-        'location': user['location'],
-        'cohort_week': user['cohort_week'],
-        'cohort_month': user['landing_timestamp'].strftime('%Y-%m')
-    }
+    return min(prob, MAX_CONVERSION_PROBABILITY)  # Cap at 95%
+
+def generate_users_loop(num_users):
+    """Generate base user sessions one user at a time (original generator)"""
+    # Generate base user sessions
+    users_data = []
+
+    for user_id in range(1, num_users + 1):
+        # Select channel
+        channel = random.choices(
+            list(CHANNELS.keys()), 
+            weights=[CHANNELS[ch]['weight'] for ch in CHANNELS.keys()]
+        )[0]
+
+        # Select device
+        device = random.choices(DEVICES, weights=DEVICE_WEIGHTS)[0]
+
+        # Generate landing timestamp
+        landing_timestamp = generate_timestamp(START_DATE, END_DATE)
+
+        # Calculate cohort week
+        cohort_week = (landing_timestamp - START_DATE).days // 7
+
+        # Demographics
+        age_group = random.choices(AGE_GROUPS, weights=AGE_WEIGHTS)[0]
+
+        location = random.choices(LOCATIONS, weights=LOCATION_WEIGHTS)[0]
+
+        # Get multipliers
+        channel_mult = CHANNELS[channel]['conversion_multiplier']
+        device_mult = DEVICE_CONVERSION[device]
+
+        users_data.append({
+            'user_id': f'U{user_id:06d}',
+            'channel': channel,
+            'device': device,
+            'age_group': age_group,
+            'location': location,
+            'landing_timestamp': landing_timestamp,
+            'cohort_week': cohort_week,
+            'channel_mult': channel_mult,
+            'device_mult': device_mult
+        })
+
+        if user_id % 10000 == 0:
+            print(f"  Generated {user_id:,} users...")
+
+    return pd.DataFrame(users_data)
+
+def generate_funnel_loop(users_df):
+    """Walk every user through the funnel stages one user at a time"""
+    funnel_data = []
+
+    for idx, user in users_df.iterrows():
+        user_journey = {
+            'user_id': user['user_id'],
+            'channel': user['channel'],
+            'device': user['device'],
+            'age_group': user['age_group'],
+            'location': user['location'],
+            'cohort_week': user['cohort_week'],
+            'cohort_month': user['landing_timestamp'].strftime('%Y-%m')
+        }
+
+        current_timestamp = user['landing_timestamp']
+
+        # Stage 1: Landing (everyone lands)
+        user_journey['stage_1_landing'] = 1
+        user_journey['landing_timestamp'] = current_timestamp
+
+        # Stage 2: Signup
+        signup_prob = calculate_conversion_probability(
+            BASE_RATES['landing_to_signup'],
+            user['channel_mult'],
+            user['device_mult'],
+            user['cohort_week']
+        )
+
+        if random.random() < signup_prob:
+            current_timestamp += timedelta(minutes=random.randint(*STAGE_DELAY_MINUTES['landing_to_signup']))
+            user_journey['stage_2_signup'] = 1
+            user_journey['signup_timestamp'] = current_timestamp
+            user_journey['landing_to_signup_minutes'] = (current_timestamp - user['landing_timestamp']).seconds / 60
+        else:
+            user_journey['stage_2_signup'] = 0
+            user_journey['exit_stage'] = 'Landing'
+            funnel_data.append(user_journey)
+            continue
+
+        # Stage 3: Product View
+        product_view_prob = calculate_conversion_probability(
+            BASE_RATES['signup_to_product_view'],
+            user['channel_mult'],
+            user['device_mult'],
+            user['cohort_week']
+        )
+
+        if random.random() < product_view_prob:
+            current_timestamp += timedelta(minutes=random.randint(*STAGE_DELAY_MINUTES['signup_to_product_view']))
+            user_journey['stage_3_product_view'] = 1
+            user_journey['product_view_timestamp'] = current_timestamp
+            user_journey['signup_to_product_minutes'] = (current_timestamp - user_journey['signup_timestamp']).seconds / 60
+        else:
+            user_journey['stage_3_product_view'] = 0
+            user_journey['exit_stage'] = 'Signup'
+            funnel_data.append(user_journey)
+            continue
+
+        # Stage 4: Add to Cart
+        cart_prob = calculate_conversion_probability(
+            BASE_RATES['product_view_to_cart'],
+            user['channel_mult'],
+            user['device_mult'],
+            user['cohort_week']
+        )
+
+        if random.random() < cart_prob:
+            current_timestamp += timedelta(minutes=random.randint(*STAGE_DELAY_MINUTES['product_view_to_cart']))
+            user_journey['stage_4_add_to_cart'] = 1
+            user_journey['add_to_cart_timestamp'] = current_timestamp
+            user_journey['product_to_cart_minutes'] = (current_timestamp - user_journey['product_view_timestamp']).seconds / 60
+        else:
+            user_journey['stage_4_add_to_cart'] = 0
+            user_journey['exit_stage'] = 'Product_View'
+            funnel_data.append(user_journey)
+            continue
+
+        # Stage 5: Purchase
+        purchase_prob = calculate_conversion_probability(
+            BASE_RATES['cart_to_purchase'],
+            user['channel_mult'],
+            user['device_mult'],
+            user['cohort_week']
+        )
+
+        if random.random() < purchase_prob:
+            current_timestamp += timedelta(minutes=random.randint(*STAGE_DELAY_MINUTES['cart_to_purchase']))
+            user_journey['stage_5_purchase'] = 1
+            user_journey['purchase_timestamp'] = current_timestamp
+            user_journey['cart_to_purchase_minutes'] = (current_timestamp - user_journey['add_to_cart_timestamp']).seconds / 60
+
+            # Add purchase value (lognormal distribution for realistic revenue)
+            user_journey['purchase_value'] = round(np.random.lognormal(*PURCHASE_VALUE_LOGNORMAL), 2)
+            user_journey['exit_stage'] = 'Purchase'
+        else:
+            user_journey['stage_5_purchase'] = 0
+            user_journey['exit_stage'] = 'Add_to_Cart'
+
+        # Calculate total journey time
+        if 'purchase_timestamp' in user_journey:
+            user_journey['total_journey_minutes'] = (user_journey['purchase_timestamp'] - user['landing_timestamp']).seconds / 60
 
-    current_timestamp = user['landing_timestamp']
-
-    # Stage 1: Landing (everyone lands)
-    user_journey['stage_1_landing'] = 1
-    user_journey['landing_timestamp'] = current_timestamp
-
-    # Stage 2: Signup
-    signup_prob = calculate_conversion_probability(
-        BASE_RATES['landing_to_signup'],
-        user['channel_mult'],
-        user['device_mult'],
-        user['cohort_week']
-    )
-
-    if random.random() < signup_prob:
-        current_timestamp += timedelta(minutes=random.randint(1, 30))
-        user_journey['stage_2_signup'] = 1
-        user_journey['signup_timestamp'] = current_timestamp
-        user_journey['landing_to_signup_minutes'] = (current_timestamp - user['landing_timestamp']).seconds / 60
-    else:
-        user_journey['stage_2_signup'] = 0
-        user_journey['exit_stage'] = 'Landing'
         funnel_data.append(user_journey)
-        continue
-
-    # Stage 3: Product View
-    product_view_prob = calculate_conversion_probability(
-        BASE_RATES['signup_to_product_view'],
-        user['channel_mult'],
-        user['device_mult'],
-        user['cohort_week']
-    )
-
-    if random.random() < product_view_prob:
-        current_timestamp += timedelta(minutes=random.randint(2, 45))
-        user_journey['stage_3_product_view'] = 1
-        user_journey['product_view_timestamp'] = current_timestamp
-        user_journey['signup_to_product_minutes'] = (current_timestamp - user_journey['signup_timestamp']).seconds / 60
-    else:
-        user_journey['stage_3_product_view'] = 0
-        user_journey['exit_stage'] = 'Signup'
-        funnel_data.append(user_journey)
-        continue
-
-    # Stage 4: Add to Cart
-    cart_prob = calculate_conversion_probability(
-        BASE_RATES['product_view_to_cart'],
-        user['channel_mult'],
-        user['device_mult'],
-        user['cohort_week']
-    )
-
-    if random.random() < cart_prob:
-        current_timestamp += timedelta(minutes=random.randint(3, 60))
-        user_journey['stage_4_add_to_cart'] = 1
-        user_journey['add_to_cart_timestamp'] = current_timestamp
-        user_journey['product_to_cart_minutes'] = (current_timestamp - user_journey['product_view_timestamp']).seconds / 60
-    else:
-        user_journey['stage_4_add_to_cart'] = 0
-        user_journey['exit_stage'] = 'Product_View'
-        funnel_data.append(user_journey)
-        continue
-
-    # Stage 5: Purchase
-    purchase_prob = calculate_conversion_probability(
-        BASE_RATES['cart_to_purchase'],
-        user['channel_mult'],
-        user['device_mult'],
-        user['cohort_week']
-    )
-
-    if random.random() < purchase_prob:
-        current_timestamp += timedelta(minutes=random.randint(5, 90))
-        user_journey['stage_5_purchase'] = 1
-        user_journey['purchase_timestamp'] = current_timestamp
-        user_journey['cart_to_purchase_minutes'] = (current_timestamp - user_journey['add_to_cart_timestamp']).seconds / 60
-
-        # Add purchase value (lognormal distribution for realistic revenue)
-        user_journey['purchase_value'] = round(np.random.lognormal(4.2, 0.6), 2)
-        user_journey['exit_stage'] = 'Purchase'
-    else:
-        user_journey['stage_5_purchase'] = 0
-        user_journey['exit_stage'] = 'Add_to_Cart'
 
-    # Calculate total journey time
-    if 'purchase_timestamp' in user_journey:
-        user_journey['total_journey_minutes'] = (user_journey['purchase_timestamp'] - user['landing_timestamp']).seconds / 60
-
-    funnel_data.append(user_journey)
-
-    if (idx + 1) % 10000 == 0:
-        print(f"  Processed {idx + 1:,} users...")
-
-funnel_df = pd.DataFrame(funnel_data)
-
-# Fill missing stage columns
-for stage_col in ['stage_2_signup', 'stage_3_product_view', 'stage_4_add_to_cart', 'stage_5_purchase']:
-    funnel_df[stage_col] = funnel_df[stage_col].fillna(0).astype(int)
-
-print(f"\n✓ Generated complete funnel data")
-
-# ============================================================================
-# SUMMARY STATISTICS
-# ============================================================================
-
-print("\n" + "="*80)
-print("DATA SUMMARY")
-print("="*80)
-
-print(f"\nTotal records: {len(funnel_df):,}")
-print(f"Date range: {funnel_df['landing_timestamp'].min()} to {funnel_df['landing_timestamp'].max()}")
-
-print("\nFunnel Performance:")
-for i, stage in enumerate(['stage_1_landing', 'stage_2_signup', 'stage_3_product_view', 
-                           'stage_4_add_to_cart', 'stage_5_purchase']):
-    count = funnel_df[stage].sum()
-    pct = (count / len(funnel_df)) * 100
-    print(f"  {stage}: {count:,} users ({pct:.2f}%)")
-
-print("\nChannel Distribution:")
-print(funnel_df['channel'].value_counts().to_string())
+        if (idx + 1) % 10000 == 0:
+            print(f"  Processed {idx + 1:,} users...")
+
+    funnel_df = pd.DataFrame(funnel_data)
+
+    # Fill missing stage columns
+    for stage_col in ['stage_2_signup', 'stage_3_product_view', 'stage_4_add_to_cart', 'stage_5_purchase']:
+        funnel_df[stage_col] = funnel_df[stage_col].fillna(0).astype(int)
+
+    return funnel_df
+
+def write_touchpoints(funnel_df, seed, part=0):
+    """Write (part 0) or append the touchpoint paths of one chunk of users; returns the touch count"""
+    touchpoints = generate_touchpoints(funnel_df, GENERATOR_CONFIG, np.random.default_rng([seed, part]))
+    touchpoints.to_csv(f'{TOUCHPOINTS_BASENAME}.csv', mode='a' if part else 'w', header=not part, index=False)
+    return len(touchpoints)
+
+def summarize_funnel(funnel_df):
+    """Mergeable summary statistics for a block of funnel rows"""
+    return {
+        'records': len(funnel_df),
+        'first_landing': funnel_df['landing_timestamp'].min(),
+        'last_landing': funnel_df['landing_timestamp'].max(),
+        'stage_counts': funnel_df[STAGE_COLUMNS].sum(),
+        'channel_counts': funnel_df['channel'].value_counts(),
+        'device_counts': funnel_df['device'].value_counts(),
+        'revenue': funnel_df['purchase_value'].sum(),
+        'orders': funnel_df['purchase_value'].count()
+    }
 
-print("\nDevice Distribution:")
-print(funnel_df['device'].value_counts().to_string())
+def merge_summaries(total, chunk):
+    """Fold one chunk's summary statistics into the running total"""
+    if total is None:
+        return chunk
+    return {
+        'records': total['records'] + chunk['records'],
+        'first_landing': min(total['first_landing'], chunk['first_landing']),
+        'last_landing': max(total['last_landing'], chunk['last_landing']),
+        'stage_counts': total['stage_counts'] + chunk['stage_counts'],
+        'channel_counts': total['channel_counts'].add(chunk['channel_counts'], fill_value=0)
+                                                .astype(int).sort_values(ascending=False),
+        'device_counts': total['device_counts'].add(chunk['device_counts'], fill_value=0)
+                                              .astype(int).sort_values(ascending=False),
+        'revenue': total['revenue'] + chunk['revenue'],
+        'orders': total['orders'] + chunk['orders']
+    }
 
-total_revenue = funnel_df['purchase_value'].sum()
-print(f"\nTotal Revenue: ${total_revenue:,.2f}")
-print(f"Average Order Value: ${funnel_df['purchase_value'].mean():.2f}")
+def parse_args():
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description='Generate synthetic marketing funnel data')
+    parser.add_argument('--mode', choices=['loop', 'vectorized'], default=None,
+                        help='loop: original per-user generator; vectorized: NumPy array generator (default: loop)')
+    parser.add_argument('--num-users', type=int, default=NUM_USERS,
+                        help=f'Number of user sessions to generate (default: {NUM_USERS:,})')
+    parser.add_argument('--layout', choices=['wide', 'events'], default='wide',
+                        help='wide: one row per user; events: one row per stage event, sorted by time '
+                             f'({EVENTS_BASENAME}.csv)')
+    parser.add_argument('--touchpoints', action='store_true',
+                        help=f'Also write each user\'s marketing touchpoint path ({TOUCHPOINTS_BASENAME}.csv) '
+                             'for multi-touch attribution')
+    parser.add_argument('--format', choices=DATA_FORMATS, default='csv',
+                        help='Output format: csv, or typed columnar parquet/feather (requires pyarrow)')
+    parser.add_argument('--seed', type=int, default=RANDOM_SEED,
+                        help=f'Random seed for reproducibility (default: {RANDOM_SEED})')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Stream users in chunks of this size to partitioned output (vectorized mode only)')
+    parser.add_argument('--output-dir', default=PARTITION_DIR,
+                        help=f'Directory for partitioned output when streaming (default: {PARTITION_DIR})')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for sharded generation (vectorized mode only)')
+    parser.add_argument('--rng', choices=['sequential', 'counter'], default=None,
+                        help='sequential: per-shard streams; counter: Philox keyed by user number '
+                             '(output independent of shard size, vectorized mode only; default: sequential)')
+    parser.add_argument('--user-id', default=None,
+                        help='Print the record of a single user (e.g. U048213) as --mode vectorized --rng counter '
+                             'generates it, and exit')
+    args = parser.parse_args()
+
+    if args.user_id is not None:
+        # Single records come from counter-based draws, so they only match that dataset
+        if args.mode == 'loop' or args.rng == 'sequential':
+            parser.error('--user-id reproduces --mode vectorized --rng counter records '
+                         '(it cannot be combined with --mode loop or --rng sequential)')
+        args.mode, args.rng = 'vectorized', 'counter'
+        match = re.fullmatch(r'[Uu]?(\d+)', args.user_id.strip())
+        if match is None:
+            parser.error(f"invalid --user-id '{args.user_id}' (expected e.g. U048213)")
+        args.user_number = int(match.group(1))
+        if not 1 <= args.user_number <= args.num_users:
+            parser.error(f"--user-id {args.user_id} is outside the dataset (U{1:06d} - U{args.num_users:06d})")
+    args.mode = args.mode or 'loop'
+    args.rng = args.rng or 'sequential'
+    if args.mode != 'vectorized' and (args.chunk_size is not None or args.workers != 1 or args.rng != 'sequential'):
+        parser.error('--chunk-size, --workers and --rng require --mode vectorized')
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error(f"--chunk-size must be at least 1 (got {args.chunk_size})")
+    if args.layout == 'events' and args.format != 'csv':
+        parser.error('--layout events writes a CSV event log (use --format csv)')
+    return args
 
 # ============================================================================
-# SAVE DATA
+# DATA GENERATION
 # ============================================================================
 
-output_file = 'marketing_funnel_data.csv'
-funnel_df.to_csv(output_file, index=False)
-
-print("\n" + "="*80)
-print(f"✓ Data saved to: {output_file}")
-print("="*80)
-print("\nData generation complete!")
-print("You can now run the analysis scripts:")
-print("  1. python 01_funnel_analysis.py")
-print("  2. python 02_attribution_analysis.py")
-print("  3. python 03_visualizations.py")
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Set seed for reproducibility
+    np.random.seed(args.seed)
+    random.seed(args.seed)
+
+    if args.user_id is not None:
+        # Random access: counter-based draws make any single user O(1) to generate
+        print(generate_user(args.user_number, GENERATOR_CONFIG, args.seed).to_string())
+        raise SystemExit(0)
+
+    print("="*80)
+    print("MARKETING FUNNEL DATA GENERATION")
+    print("="*80)
+    print(f"\nGenerating {args.num_users:,} user sessions ({args.mode} mode)...")
+    print(f"Date range: {START_DATE.date()} to {END_DATE.date()}")
+    print(f"Channels: {len(CHANNELS)}")
+    print(f"Devices: {len(DEVICES)}")
+
+    if args.layout == 'wide' and not args.touchpoints and os.path.exists(f'{TOUCHPOINTS_BASENAME}.csv'):
+        # A touchpoint log from an earlier run belongs to different users
+        os.remove(f'{TOUCHPOINTS_BASENAME}.csv')
+        print(f"Removed stale {TOUCHPOINTS_BASENAME}.csv (pass --touchpoints to regenerate it)")
+
+    if args.chunk_size is not None:
+        # Streaming: only the chunks in flight are ever held in memory
+        if args.layout == 'events':
+            # Events are spilled to per-day buckets, then merged into one time-ordered log
+            spill_dir = f'{EVENTS_BASENAME}_spill'
+            print(f"Streaming in chunks of {args.chunk_size:,} users to: {EVENTS_BASENAME}.csv")
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        else:
+            print(f"Streaming in chunks of {args.chunk_size:,} users to: {args.output_dir}/")
+            clear_partitions(args.output_dir)
+
+        summary = None
+        num_touchpoints = 0
+        start_time = time.perf_counter()
+        chunks = generate_funnel_chunks(args.num_users, GENERATOR_CONFIG, args.seed,
+                                        args.chunk_size, args.workers, rng_mode=args.rng)
+        for part, chunk_df in enumerate(chunks):
+            if args.layout == 'events':
+                spill_events(to_event_log(chunk_df), spill_dir)
+            else:
+                write_partitions(chunk_df, args.output_dir, args.format, part)
+            if args.touchpoints:
+                num_touchpoints += write_touchpoints(chunk_df, args.seed, part)
+            summary = merge_summaries(summary, summarize_funnel(chunk_df))
+            print(f"  Written {summary['records']:,} users...")
+        elapsed = time.perf_counter() - start_time
+
+        print(f"\n✓ Generated and saved {summary['records']:,} user sessions "
+              f"in {elapsed:.2f}s ({summary['records'] / max(elapsed, 1e-9):,.0f} users/sec)")
+    elif args.mode == 'vectorized':
+        # Independently seeded shards, merged in user order
+        print(f"Shards of {SHARD_SIZE:,} users across {args.workers} worker(s)")
+        start_time = time.perf_counter()
+        funnel_df = pd.concat(generate_funnel_chunks(args.num_users, GENERATOR_CONFIG, args.seed,
+                                                     SHARD_SIZE, args.workers, rng_mode=args.rng),
+                              ignore_index=True)
+        elapsed = time.perf_counter() - start_time
+
+        print(f"\n✓ Generated {len(funnel_df):,} user sessions with funnel progression "
+              f"in {elapsed:.2f}s ({len(funnel_df) / max(elapsed, 1e-9):,.0f} users/sec)")
+        summary = summarize_funnel(funnel_df)
+    else:
+        # Generate base user sessions
+        start_time = time.perf_counter()
+        users_df = generate_users_loop(args.num_users)
+        elapsed = time.perf_counter() - start_time
+
+        print(f"\n✓ Generated {len(users_df):,} user sessions "
+              f"in {elapsed:.2f}s ({len(users_df) / max(elapsed, 1e-9):,.0f} users/sec)")
+
+        # Generate funnel progression
+        print("\nGenerating funnel progression...")
+        start_time = time.perf_counter()
+        funnel_df = generate_funnel_loop(users_df)
+        elapsed = time.perf_counter() - start_time
+
+        print(f"\n✓ Generated complete funnel data in {elapsed:.2f}s")
+        summary = summarize_funnel(funnel_df)
+
+    # ============================================================================
+    # SUMMARY STATISTICS
+    # ============================================================================
+
+    print("\n" + "="*80)
+    print("DATA SUMMARY")
+    print("="*80)
+
+    print(f"\nTotal records: {summary['records']:,}")
+    print(f"Date range: {summary['first_landing']} to {summary['last_landing']}")
+
+    print("\nFunnel Performance:")
+    for stage in STAGE_COLUMNS:
+        count = summary['stage_counts'][stage]
+        pct = (count / summary['records']) * 100
+        print(f"  {stage}: {count:,} users ({pct:.2f}%)")
+
+    print("\nChannel Distribution:")
+    print(summary['channel_counts'].to_string())
+
+    print("\nDevice Distribution:")
+    print(summary['device_counts'].to_string())
+
+    print(f"\nTotal Revenue: ${summary['revenue']:,.2f}")
+    print(f"Average Order Value: ${summary['revenue'] / summary['orders']:.2f}")
+
+    # ============================================================================
+    # SAVE DATA
+    # ============================================================================
+
+    if args.layout == 'events':
+        output_file = f'{EVENTS_BASENAME}.csv'
+        if args.chunk_size is not None:
+            num_events = merge_event_spills(spill_dir, output_file)
+        else:
+            events_df = to_event_log(funnel_df)
+            events_df.to_csv(output_file, index=False)
+            num_events = len(events_df)
+        output_file += f" ({num_events:,} stage events)"
+    elif args.chunk_size is not None:
+        output_file = f"{args.output_dir}/ (one file per cohort_month)"
+    else:
+        output_file = f'{DATA_BASENAME}.{args.format}'
+        write_funnel_data(funnel_df, output_file)
+
+    if args.touchpoints and args.chunk_size is None:
+        num_touchpoints = write_touchpoints(funnel_df, args.seed)
+
+    print("\n" + "="*80)
+    print(f"✓ Data saved to: {output_file}")
+    if args.touchpoints:
+        print(f"✓ Touchpoints saved to: {TOUCHPOINTS_BASENAME}.csv ({num_touchpoints:,} touches)")
+    print("="*80)
+    print("\nData generation complete!")
+    if args.layout == 'events':
+        print("You can now replay the event log through the streaming funnel:")
+        print(f"  python 04_streaming_funnel.py --file {EVENTS_BASENAME}.csv")
+    else:
+        print("You can now run the analysis scripts:")
+        print("  1. python 01_funnel_analysis.py")
+        print("  2. python 02_attribution_analysis.py")
+        print("  3. python 03_visualizations.py")
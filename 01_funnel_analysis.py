@@ -4,6 +4,7 @@ Author: Marketing Analytics Project
 Description: Comprehensive funnel analysis with conversion metrics, drop-off analysis, and cohort analysis
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -12,19 +13,68 @@ from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from funnel_data import default_data_path, load_event_log, load_funnel_data
+from funnel_metrics import load_funnel_cube, rollup_cube, rollup_funnel, update_funnel_state
+from funnel_sequence import parse_funnel, sequence_funnel_report, window_funnel
+
 # Set style
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (14, 8)
 plt.rcParams['font.size'] = 10
 
-# Load data
-print("Loading marketing funnel data...")
-df = pd.read_csv('marketing_funnel_data.csv', parse_dates=['landing_timestamp', 'signup_timestamp', 
-                                                             'product_view_timestamp', 'add_to_cart_timestamp',
-                                                             'purchase_timestamp'])
-
-print(f"Dataset loaded: {len(df):,} user sessions")
-print(f"Date range: {df['landing_timestamp'].min().date()} to {df['landing_timestamp'].max().date()}")
+parser = argparse.ArgumentParser(description='Multi-channel marketing funnel analysis')
+parser.add_argument('--data', default=None,
+                    help='Data file or partition directory (default: most recently generated)')
+parser.add_argument('--no-cache', action='store_true',
+                    help='Re-parse the source data instead of using the .funnel_cache/ copy')
+parser.add_argument('--incremental', action='store_true',
+                    help='Fold only sessions appended since the last run into the .funnel_state/ '
+                         'aggregates (skips journey timings, which need raw sessions)')
+parser.add_argument('--funnel', default=None,
+                    help="Also evaluate a custom ordered funnel over the event log, e.g. "
+                         "'landing,product_view,purchase' ('|' separates alternative events)")
+parser.add_argument('--funnel-window', default='24h',
+                    help='Conversion window of the custom funnel, measured from its first stage (default: 24h)')
+parser.add_argument('--events', default=None,
+                    help='Event log for --funnel (default: marketing_funnel_events.csv)')
+args = parser.parse_args()
+
+custom_stages = None
+if args.funnel:
+    try:
+        custom_stages = parse_funnel(args.funnel)
+    except ValueError as error:
+        parser.error(str(error))
+    try:
+        funnel_window = pd.Timedelta(args.funnel_window)
+    except ValueError:
+        parser.error(f"--funnel-window '{args.funnel_window}' is not a duration like 24h or 90min")
+    if funnel_window <= pd.Timedelta(0):
+        parser.error(f"--funnel-window must be positive (got {args.funnel_window})")
+
+# Raw session columns this script uses - only these are read from disk. Counts,
+# revenue and every breakdown are rolled up from the precomputed funnel cube.
+ANALYSIS_COLUMNS = [
+    'landing_timestamp', 'stage_5_purchase',
+    'landing_to_signup_minutes', 'signup_to_product_minutes', 'product_to_cart_minutes',
+    'cart_to_purchase_minutes', 'total_journey_minutes'
+]
+
+# Load data (CSV, Parquet, Feather or partition directory - whichever was generated last)
+data_path = args.data or default_data_path()
+print(f"Loading marketing funnel data from {data_path}...")
+if args.incremental:
+    # Reports are rebuilt from mergeable aggregates; only new rows are read
+    cube, new_sessions = update_funnel_state(data_path)
+    df = None
+    print(f"Folded {new_sessions:,} new user sessions into the funnel state")
+    print(f"Dataset: {cube['sessions'].sum():,} user sessions")
+else:
+    df = load_funnel_data(data_path, columns=ANALYSIS_COLUMNS, use_cache=not args.no_cache)
+    cube = load_funnel_cube(data_path, use_cache=not args.no_cache)
+
+    print(f"Dataset loaded: {len(df):,} user sessions")
+    print(f"Date range: {df['landing_timestamp'].min().date()} to {df['landing_timestamp'].max().date()}")
 
 # ============================================================================
 # 1. OVERALL FUNNEL METRICS
@@ -35,11 +85,11 @@ print("OVERALL FUNNEL PERFORMANCE ANALYSIS")
 print("="*80)
 
 stages = {
-    'Landing': df['stage_1_landing'].sum(),
-    'Signup': df['stage_2_signup'].sum(),
-    'Product View': df['stage_3_product_view'].sum(),
-    'Add to Cart': df['stage_4_add_to_cart'].sum(),
-    'Purchase': df['stage_5_purchase'].sum()
+    'Landing': cube['stage_1_landing'].sum(),
+    'Signup': cube['stage_2_signup'].sum(),
+    'Product View': cube['stage_3_product_view'].sum(),
+    'Add to Cart': cube['stage_4_add_to_cart'].sum(),
+    'Purchase': cube['stage_5_purchase'].sum()
 }
 
 funnel_metrics = []
@@ -100,12 +150,12 @@ print(f"   - Industry benchmark typically 2-5%")
 print(f"   - Current performance: {'ABOVE' if (stages['Purchase']/stages['Landing'])*100 > 5 else 'WITHIN'} benchmark")
 
 # Revenue metrics
-total_revenue = df['purchase_value'].sum()
-avg_order_value = df['purchase_value'].mean()
+total_revenue = cube['purchase_value'].sum()
+avg_order_value = total_revenue / stages['Purchase']
 print(f"\n3. Revenue Metrics:")
 print(f"   - Total Revenue: ${total_revenue:,.2f}")
 print(f"   - Average Order Value: ${avg_order_value:.2f}")
-print(f"   - Revenue per Visitor: ${total_revenue/len(df):.2f}")
+print(f"   - Revenue per Visitor: ${total_revenue/cube['sessions'].sum():.2f}")
 
 # ============================================================================
 # 2. CHANNEL PERFORMANCE ANALYSIS
@@ -115,32 +165,9 @@ print("\n\n" + "="*80)
 print("CHANNEL PERFORMANCE ANALYSIS")
 print("="*80)
 
-channel_metrics = []
-
-for channel in df['channel'].unique():
-    channel_data = df[df['channel'] == channel]
-
-    total_users = len(channel_data)
-    signups = channel_data['stage_2_signup'].sum()
-    purchases = channel_data['stage_5_purchase'].sum()
-    revenue = channel_data['purchase_value'].sum()
-
-    signup_rate = (signups / total_users) * 100
-    conv_rate = (purchases / total_users) * 100
-    avg_revenue_per_user = revenue / total_users
-
-    channel_metrics.append({
-        'Channel': channel,
-        'Sessions': total_users,
-        'Signups': signups,
-        'Purchases': purchases,
-        'Signup Rate': signup_rate,
-        'Conversion Rate': conv_rate,
-        'Revenue': revenue,
-        'Revenue/User': avg_revenue_per_user
-    })
-
-channel_df = pd.DataFrame(channel_metrics).sort_values('Conversion Rate', ascending=False)
+channel_df = rollup_funnel(cube, ['channel']).rename(columns={'channel': 'Channel'})
+channel_df = channel_df[['Channel', 'Sessions', 'Signups', 'Purchases', 'Signup Rate',
+                         'Conversion Rate', 'Revenue', 'Revenue/User']].sort_values('Conversion Rate', ascending=False)
 
 print("\nChannel Performance Summary:")
 print(channel_df.to_string(index=False))
@@ -170,26 +197,8 @@ print("\n\n" + "="*80)
 print("DEVICE PERFORMANCE ANALYSIS")
 print("="*80)
 
-device_metrics = []
-
-for device in df['device'].unique():
-    device_data = df[df['device'] == device]
-
-    total_users = len(device_data)
-    purchases = device_data['stage_5_purchase'].sum()
-    revenue = device_data['purchase_value'].sum()
-
-    conv_rate = (purchases / total_users) * 100
-
-    device_metrics.append({
-        'Device': device,
-        'Sessions': total_users,
-        'Purchases': purchases,
-        'Conversion Rate': conv_rate,
-        'Revenue': revenue
-    })
-
-device_df = pd.DataFrame(device_metrics).sort_values('Conversion Rate', ascending=False)
+device_df = rollup_funnel(cube, ['device']).rename(columns={'device': 'Device'})
+device_df = device_df[['Device', 'Sessions', 'Purchases', 'Conversion Rate', 'Revenue']].sort_values('Conversion Rate', ascending=False)
 
 print("\nDevice Performance Summary:")
 print(device_df.to_string(index=False))
@@ -210,26 +219,29 @@ print("\n\n" + "="*80)
 print("TIME-TO-CONVERT ANALYSIS")
 print("="*80)
 
-# Analyze users who completed purchase
-purchasers = df[df['stage_5_purchase'] == 1].copy()
-
-if len(purchasers) > 0:
-    avg_journey_time = purchasers['total_journey_minutes'].mean()
-    median_journey_time = purchasers['total_journey_minutes'].median()
-
-    print(f"\nAverage Journey Time: {avg_journey_time:.1f} minutes ({avg_journey_time/60:.1f} hours)")
-    print(f"Median Journey Time: {median_journey_time:.1f} minutes ({median_journey_time/60:.1f} hours)")
-
-    # Stage-specific timings
-    print("\nAverage Time Between Stages:")
-    if 'landing_to_signup_minutes' in purchasers.columns:
-        print(f"  Landing → Signup: {purchasers['landing_to_signup_minutes'].mean():.1f} minutes")
-    if 'signup_to_product_minutes' in purchasers.columns:
-        print(f"  Signup → Product View: {purchasers['signup_to_product_minutes'].mean():.1f} minutes")
-    if 'product_to_cart_minutes' in purchasers.columns:
-        print(f"  Product View → Add to Cart: {purchasers['product_to_cart_minutes'].mean():.1f} minutes")
-    if 'cart_to_purchase_minutes' in purchasers.columns:
-        print(f"  Add to Cart → Purchase: {purchasers['cart_to_purchase_minutes'].mean():.1f} minutes")
+if df is None:
+    print("\nSkipped in --incremental mode (journey timings need raw sessions)")
+else:
+    # Analyze users who completed purchase
+    purchasers = df[df['stage_5_purchase'] == 1].copy()
+
+    if len(purchasers) > 0:
+        avg_journey_time = purchasers['total_journey_minutes'].mean()
+        median_journey_time = purchasers['total_journey_minutes'].median()
+
+        print(f"\nAverage Journey Time: {avg_journey_time:.1f} minutes ({avg_journey_time/60:.1f} hours)")
+        print(f"Median Journey Time: {median_journey_time:.1f} minutes ({median_journey_time/60:.1f} hours)")
+
+        # Stage-specific timings
+        print("\nAverage Time Between Stages:")
+        if 'landing_to_signup_minutes' in purchasers.columns:
+            print(f"  Landing → Signup: {purchasers['landing_to_signup_minutes'].mean():.1f} minutes")
+        if 'signup_to_product_minutes' in purchasers.columns:
+            print(f"  Signup → Product View: {purchasers['signup_to_product_minutes'].mean():.1f} minutes")
+        if 'product_to_cart_minutes' in purchasers.columns:
+            print(f"  Product View → Add to Cart: {purchasers['product_to_cart_minutes'].mean():.1f} minutes")
+        if 'cart_to_purchase_minutes' in purchasers.columns:
+            print(f"  Add to Cart → Purchase: {purchasers['cart_to_purchase_minutes'].mean():.1f} minutes")
 
 # ============================================================================
 # 5. COHORT ANALYSIS
@@ -239,12 +251,9 @@ print("\n\n" + "="*80)
 print("COHORT ANALYSIS (Monthly)")
 print("="*80)
 
-cohort_metrics = df.groupby('cohort_month').agg({
-    'user_id': 'count',
-    'stage_2_signup': 'sum',
-    'stage_5_purchase': 'sum',
-    'purchase_value': 'sum'
-}).rename(columns={'user_id': 'Total_Users'})
+cohort_metrics = rollup_cube(cube, 'cohort_month', [
+    'sessions', 'stage_2_signup', 'stage_5_purchase', 'purchase_value'
+]).rename(columns={'sessions': 'Total_Users'})
 
 cohort_metrics['Signup_Rate'] = (cohort_metrics['stage_2_signup'] / cohort_metrics['Total_Users']) * 100
 cohort_metrics['Conversion_Rate'] = (cohort_metrics['stage_5_purchase'] / cohort_metrics['Total_Users']) * 100
@@ -276,25 +285,45 @@ print("="*80)
 
 # Age group analysis
 print("\nAge Group Performance:")
-age_metrics = df.groupby('age_group').agg({
-    'user_id': 'count',
-    'stage_5_purchase': 'sum',
-    'purchase_value': 'sum'
-})
+age_metrics = rollup_cube(cube, 'age_group', [
+    'sessions', 'stage_5_purchase', 'purchase_value'
+]).rename(columns={'sessions': 'user_id'})
 age_metrics['Conversion_Rate'] = (age_metrics['stage_5_purchase'] / age_metrics['user_id']) * 100
 age_metrics['Avg_Order_Value'] = age_metrics['purchase_value'] / age_metrics['stage_5_purchase']
 print(age_metrics.to_string())
 
 # Location analysis
 print("\nLocation Performance:")
-location_metrics = df.groupby('location').agg({
-    'user_id': 'count',
-    'stage_5_purchase': 'sum',
-    'purchase_value': 'sum'
-})
+location_metrics = rollup_cube(cube, 'location', [
+    'sessions', 'stage_5_purchase', 'purchase_value'
+]).rename(columns={'sessions': 'user_id'})
 location_metrics['Conversion_Rate'] = (location_metrics['stage_5_purchase'] / location_metrics['user_id']) * 100
 print(location_metrics.to_string())
 
+# ============================================================================
+# 7. CUSTOM SEQUENCE FUNNEL (optional)
+# ============================================================================
+
+if args.funnel:
+    print("\n\n" + "="*80)
+    print(f"CUSTOM FUNNEL: {args.funnel} (within {args.funnel_window})")
+    print("="*80)
+
+    events = load_event_log(args.events, columns=['timestamp', 'user_id', 'event_type', 'channel'])
+    user_levels = window_funnel(events, custom_stages, funnel_window, dimensions=['channel'])
+
+    custom_funnel = sequence_funnel_report(user_levels['level'].to_numpy(), custom_stages)
+    print(f"\nUsers evaluated: {len(user_levels):,}")
+    print(custom_funnel.to_string(index=False, float_format=lambda x: f"{x:.2f}%"))
+
+    # Share of each channel's entrants that completed the whole sequence
+    entrants = user_levels[user_levels['level'] > 0]
+    completion = ((entrants['level'] == len(custom_stages))
+                  .groupby(entrants['channel'], observed=True).mean() * 100).sort_values(ascending=False)
+    print("\nCompletion Rate by Channel:")
+    for channel, rate in completion.items():
+        print(f"  {channel}: {rate:.2f}%")
+
 print("\n\n" + "="*80)
 print("ANALYSIS COMPLETE")
 print("="*80)
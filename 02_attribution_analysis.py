@@ -4,6 +4,8 @@ Author: Marketing Analytics Project
 Description: Compare different attribution models and analyze channel contribution to conversions
 """
 
+import argparse
+import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -11,283 +13,415 @@ import seaborn as sns
 import warnings
 warnings.filterwarnings('ignore')
 
-# Load data
-print("Loading marketing funnel data...")
-df = pd.read_csv('marketing_funnel_data.csv', parse_dates=['landing_timestamp'])
-
-# Filter to only purchasers for attribution analysis
-purchasers = df[df['stage_5_purchase'] == 1].copy()
-print(f"Analyzing {len(purchasers):,} conversions across {df['channel'].nunique()} channels")
-
-# ============================================================================
-# 1. ATTRIBUTION MODEL IMPLEMENTATIONS
-# ============================================================================
-
-print("\n" + "="*80)
-print("MULTI-TOUCH ATTRIBUTION MODELING")
-print("="*80)
-
-# In this simplified version, each user has one touchpoint (their acquisition channel)
-# In real-world scenarios, users would have multiple touchpoints across their journey
-
-def first_touch_attribution(channel_data):
-    """First-touch: 100% credit to first interaction"""
-    return channel_data.groupby('channel').agg({
-        'user_id': 'count',
-        'purchase_value': 'sum'
-    }).rename(columns={'user_id': 'Conversions', 'purchase_value': 'Revenue'})
-
-def last_touch_attribution(channel_data):
-    """Last-touch: 100% credit to last interaction before conversion"""
-    # In single-touch data, this equals first-touch
-    return first_touch_attribution(channel_data)
-
-def linear_attribution(channel_data):
-    """Linear: Equal credit across all touchpoints"""
-    # In single-touch data, this equals first-touch
-    # In multi-touch, would divide credit equally
-    return first_touch_attribution(channel_data)
-
-def time_decay_attribution(channel_data, decay_rate=0.5):
-    """Time-decay: More recent touchpoints get more credit"""
-    # Simplified: adjust credit based on conversion speed
-    results = []
-    for channel in channel_data['channel'].unique():
-        channel_df = channel_data[channel_data['channel'] == channel]
-
-        # Weight by recency (faster conversions get slightly more weight)
-        avg_time = channel_df['total_journey_minutes'].mean()
-        time_weight = 1 / (1 + avg_time / 100)  # Normalize
-
-        conversions = len(channel_df)
-        revenue = channel_df['purchase_value'].sum() * time_weight
-
-        results.append({
-            'channel': channel,
-            'Conversions': conversions,
-            'Revenue': revenue
-        })
-
-    return pd.DataFrame(results).set_index('channel')
-
-def position_based_attribution(channel_data, first_weight=0.4, last_weight=0.4):
-    """Position-based (U-shaped): 40% first, 40% last, 20% middle"""
-    # Simplified version for single-touch
-    return first_touch_attribution(channel_data)
-
-# ============================================================================
-# 2. CALCULATE ATTRIBUTION FOR EACH MODEL
-# ============================================================================
-
-print("\nCalculating attribution models...")
-
-# First-Touch Attribution
-first_touch = first_touch_attribution(purchasers)
-first_touch['Attribution_Model'] = 'First-Touch'
-
-# Last-Touch Attribution
-last_touch = last_touch_attribution(purchasers)
-last_touch['Attribution_Model'] = 'Last-Touch'
-
-# Linear Attribution
-linear = linear_attribution(purchasers)
-linear['Attribution_Model'] = 'Linear'
-
-# Time-Decay Attribution
-time_decay = time_decay_attribution(purchasers)
-time_decay['Attribution_Model'] = 'Time-Decay'
-
-# Position-Based Attribution
-position_based = position_based_attribution(purchasers)
-position_based['Attribution_Model'] = 'Position-Based'
-
-# ============================================================================
-# 3. COMPARE ATTRIBUTION MODELS
-# ============================================================================
-
-print("\n" + "="*80)
-print("ATTRIBUTION MODEL COMPARISON")
-print("="*80)
-
-# Combine all models
-all_models = pd.concat([
-    first_touch.reset_index(),
-    last_touch.reset_index(),
-    linear.reset_index(),
-    time_decay.reset_index(),
-    position_based.reset_index()
-])
-
-# Calculate revenue share for each model
-attribution_comparison = all_models.pivot(index='channel', columns='Attribution_Model', values='Revenue')
-attribution_comparison = attribution_comparison.fillna(0)
-
-# Calculate percentage of total revenue
-for col in attribution_comparison.columns:
-    total = attribution_comparison[col].sum()
-    attribution_comparison[f'{col}_Pct'] = (attribution_comparison[col] / total) * 100
-
-print("\nRevenue Attribution by Model:")
-print(attribution_comparison.to_string())
-
-# Save attribution comparison
-attribution_comparison.to_csv('attribution_model_comparison.csv')
-print("\n✓ Saved: attribution_model_comparison.csv")
-
-# ============================================================================
-# 4. CALCULATE ROI/ROAS BY CHANNEL
-# ============================================================================
-
-print("\n\n" + "="*80)
-print("ROI/ROAS ANALYSIS BY CHANNEL")
-print("="*80)
-
-# Simulate marketing spend by channel (cost per acquisition varies by channel)
-# These are realistic industry averages
-cpa_by_channel = {
-    'Organic Search': 15,    # Lower cost (SEO investment amortized)
-    'Paid Search': 35,       # Higher CPC
-    'Social Media': 28,      # Mid-range
-    'Email': 5,              # Very low marginal cost
-    'Direct': 8,             # Brand awareness spillover
-    'Referral': 12           # Partnership costs
-}
-
-roi_metrics = []
-
-for channel in df['channel'].unique():
-    channel_data = df[df['channel'] == channel]
-
-    total_sessions = len(channel_data)
-    conversions = channel_data['stage_5_purchase'].sum()
-    revenue = channel_data['purchase_value'].sum()
-
-    # Calculate spend
-    cost_per_session = cpa_by_channel.get(channel, 20)
-    total_spend = total_sessions * cost_per_session
+from funnel_attribution import (ATTRIBUTION_MODELS, JOURNEY_COLUMNS, MAX_EXACT_SHAPLEY_CHANNELS, attribute_paths,
+                                dedup_paths, path_table, session_journeys, update_attribution_state)
+from funnel_budget import (CPA_BY_CHANNEL, MIN_CURVE_R_SQUARED, cost_sensitivity, fit_response_curves, marginal_roas,
+                           optimize_budget, parse_cost_grid, response_revenue, session_cost, simulate_scenarios,
+                           unreliable_curves)
+from funnel_data import TOUCHPOINTS_BASENAME, default_data_path, load_funnel_data, load_touchpoints
+from funnel_metrics import load_funnel_cube, rollup_funnel, update_funnel_state
+
+parser = argparse.ArgumentParser(description='Multi-touch attribution and ROI analysis')
+parser.add_argument('--data', default=None,
+                    help='Data file or partition directory (default: most recently generated)')
+parser.add_argument('--no-cache', action='store_true',
+                    help='Re-parse the source data instead of using the .funnel_cache/ copy')
+parser.add_argument('--touchpoints', default=None,
+                    help=f'Touchpoint log for multi-touch paths (default: {TOUCHPOINTS_BASENAME}.csv if present, '
+                         'otherwise each user\'s acquisition channel only)')
+parser.add_argument('--incremental', action='store_true',
+                    help='Fold only sessions and touches appended since the last run into the .funnel_state/ '
+                         'funnel cube and path counts, and report from those (time-decay then uses mean touch '
+                         'ages per path)')
+parser.add_argument('--state-window-days', type=int, default=None,
+                    help='With --incremental, keep only journeys that ended in the last N days (default: all)')
+parser.add_argument('--state-half-life-days', type=float, default=None,
+                    help='With --incremental, halve the weight of journeys every N days before the newest '
+                         '(default: no decay)')
+parser.add_argument('--cost-grid', action='append', default=[], metavar='CHANNEL=LOW:HIGH:STEPS',
+                    help='Cost-per-session multipliers for a channel (e.g. "Paid Search=0.7:1.3:7" or '
+                         '"Email=0.5,1,2"); repeat for more channels. ROI metrics for every combination '
+                         'are written to cpa_sensitivity.csv')
+parser.add_argument('--scenarios', type=int, default=100000,
+                    help='Joint draws of channel response and CPA for the budget scenario simulation (default: 100000)')
+parser.add_argument('--cpa-uncertainty', type=float, default=0.2,
+                    help='Log-scale spread of each channel\'s true cost per session around cpa_by_channel (default: 0.2)')
+parser.add_argument('--workers', type=int, default=1,
+                    help='Worker processes for the scenario simulation (default: 1)')
+parser.add_argument('--half-life-days', type=float, default=7.0,
+                    help='Days for a touch\'s time-decay weight to halve (default: 7)')
+parser.add_argument('--markov-order', type=int, default=1,
+                    help='Number of preceding channels a Markov state remembers (default: 1)')
+parser.add_argument('--min-curve-r-squared', type=float, default=MIN_CURVE_R_SQUARED,
+                    help='Channels whose response curve explains less of their weekly revenue variance are held '
+                         f'at current spend (default: {MIN_CURVE_R_SQUARED})')
+parser.add_argument('--min-spend-ratio', type=float, default=0.5,
+                    help='Lowest recommended spend per channel, as a multiple of current spend (default: 0.5)')
+parser.add_argument('--max-spend-ratio', type=float, default=2.0,
+                    help='Highest recommended spend per channel, as a multiple of current spend (default: 2.0)')
+
+# Everything below runs only as a script: the scenario simulation's worker
+# processes re-import this module when they are spawned
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if not 0 <= args.min_spend_ratio <= 1 <= args.max_spend_ratio:
+        # The total budget is kept, so the bounds must allow current spend
+        parser.error(f"spend ratios must satisfy 0 <= --min-spend-ratio <= 1 <= --max-spend-ratio "
+                     f"(got {args.min_spend_ratio} and {args.max_spend_ratio})")
+    if not 0 <= args.min_curve_r_squared <= 1:
+        parser.error(f"--min-curve-r-squared must be between 0 and 1 (got {args.min_curve_r_squared})")
+    for option, value in [('--half-life-days', args.half_life_days),
+                          ('--state-window-days', args.state_window_days),
+                          ('--state-half-life-days', args.state_half_life_days)]:
+        if value is not None and not value > 0:
+            parser.error(f"{option} must be positive (got {value})")
+    for option, value in [('--markov-order', args.markov_order), ('--scenarios', args.scenarios),
+                          ('--workers', args.workers)]:
+        if value < 1:
+            parser.error(f"{option} must be at least 1 (got {value})")
+
+    cost_grids = {}
+    for spec in args.cost_grid:
+        try:
+            channel, multipliers = parse_cost_grid(spec)
+        except ValueError as error:
+            parser.error(str(error))
+        if channel in cost_grids:
+            parser.error(f"--cost-grid given twice for channel '{channel}'")
+        cost_grids[channel] = multipliers
+
+    # Load data (CSV, Parquet, Feather or partition directory - whichever was generated last)
+    data_path = args.data or default_data_path()
+
+    # Use the generated touchpoint log when available, otherwise each user's single
+    # acquisition touch (the landing session)
+    touchpoints_path = args.touchpoints
+    if touchpoints_path is None and os.path.exists(f'{TOUCHPOINTS_BASENAME}.csv'):
+        touchpoints_path = f'{TOUCHPOINTS_BASENAME}.csv'
+
+    print(f"Loading marketing funnel data from {data_path}...")
+    if args.incremental:
+        # Channel totals come from the mergeable funnel cube and attribution from
+        # the stored path counts; only rows appended since the last run are read
+        cube, new_sessions = update_funnel_state(data_path)
+        print(f"Folded {new_sessions:,} new user sessions into the funnel state")
+    else:
+        # Only the session columns the journeys need are read from disk
+        df = load_funnel_data(data_path, columns=JOURNEY_COLUMNS, use_cache=not args.no_cache)
+        cube = load_funnel_cube(data_path, use_cache=not args.no_cache)
+    print(f"Analyzing {cube['stage_5_purchase'].sum():,} conversions across {cube['channel'].nunique()} channels")
+
+    # Cost grid channels are checked against the data before any model runs
+    data_channels = sorted(cube['channel'].astype(str).unique())
+    unknown_channels = [channel for channel in cost_grids if channel not in data_channels]
+    if unknown_channels:
+        parser.error(f"unknown channel(s) in --cost-grid: {', '.join(unknown_channels)}; "
+                     f"valid channels: {', '.join(data_channels)}")
+
+    # ========================================================================
+    # 1. TOUCHPOINT PATHS
+    # ========================================================================
+
+    print("\n" + "="*80)
+    print("MULTI-TOUCH ATTRIBUTION MODELING")
+    print("="*80)
+
+    if touchpoints_path:
+        print(f"\nLoading touchpoint paths from {touchpoints_path}...")
+    else:
+        print("\nNo touchpoint log found - using single-touch paths (acquisition channel only)")
+
+    if args.incremental:
+        # New journeys are folded into the stored path counts and every model
+        # below runs over the accumulated counts
+        try:
+            state, new_journeys = update_attribution_state(data_path, touchpoints_path,
+                                                           window_days=args.state_window_days,
+                                                           half_life_days=args.state_half_life_days)
+        except ValueError as error:
+            parser.error(str(error))
+        paths = state.paths()
+        journeys = None
+        print(f"Folded {new_journeys:,} new journeys into the attribution state "
+              f"({paths['conversions'].sum() + paths['null_count'].sum():,.0f} retained)")
+        if not len(paths['conversions']):
+            raise SystemExit("No journeys to attribute yet")
+    else:
+        # Every user's ordered path as flat arrays for funnel_attribution.py;
+        # users who never purchased contribute null (non-converting) paths
+        try:
+            journeys = session_journeys(df, load_touchpoints(touchpoints_path) if touchpoints_path else None)
+        except ValueError as error:
+            parser.error(str(error))
+        print(f"User journeys: {len(journeys['revenue']):,} "
+              f"({len(journeys['touch_channel']) / max(len(journeys['revenue']), 1):.2f} "
+              "touchpoints per journey on average)")
+
+        # Collapse journeys into distinct channel sequences with counts - every
+        # model below runs over these, so its cost scales with distinct paths, not users
+        paths = dedup_paths(journeys)
+    print(f"Distinct paths: {len(paths['revenue']):,}")
+
+    top_paths = path_table(paths).nlargest(5, 'conversions')
+    print("\nMost common converting paths:")
+    for _, row in top_paths.iterrows():
+        print(f"  {row['path']:50s} {row['conversions']:>8,.0f} conversions, "
+              f"{row['null_count']:>8,.0f} non-converting")
+
+    # ========================================================================
+    # 2. CALCULATE ATTRIBUTION FOR EACH MODEL
+    # ========================================================================
+
+    print("\nCalculating attribution models...")
+
+    # Every model's channel credit from one pass over the paths: First-Touch,
+    # Last-Touch, Linear, Time-Decay (per-touch exponential decay, exact from the
+    # journeys outside incremental mode), Position-Based (40-20-40), Markov
+    # (removal effects, uses non-converting paths too) and Shapley (exact over
+    # every channel coalition for up to 16 channels)
+    credit = attribute_paths(paths, ATTRIBUTION_MODELS, half_life_days=args.half_life_days, first_weight=0.4,
+                             last_weight=0.4, markov_order=args.markov_order, journeys=journeys)
+    first_touch = credit.xs('First-Touch', axis=1, level='Attribution_Model')
+
+    removal_effects = pd.DataFrame(credit.attrs['markov_removal_effects'])
+    print(f"\nMarkov removal effects (order {args.markov_order}) - share of conversions lost without each channel:")
+    for channel, row in removal_effects.sort_values('Conversions', ascending=False).iterrows():
+        print(f"  {channel:20s} {row['Conversions'] * 100:6.2f}%")
+
+    num_channels = len(paths['channels'])
+    if num_channels <= MAX_EXACT_SHAPLEY_CHANNELS:
+        print(f"\nShapley values: exact over {2 ** num_channels:,} channel coalitions")
+    else:
+        print(f"\nShapley values: {credit.attrs['shapley_permutations']:,} sampled channel orderings "
+              "(revenue credit ± standard error):")
+        shapley_se = pd.DataFrame(credit.attrs['shapley_standard_errors'])
+        for channel, revenue in credit[('Revenue', 'Shapley')].sort_values(ascending=False).items():
+            print(f"  {channel:20s} ${revenue:>14,.2f} ± ${shapley_se.loc[channel, 'Revenue']:,.2f}")
+
+    # ========================================================================
+    # 3. COMPARE ATTRIBUTION MODELS
+    # ========================================================================
+
+    print("\n" + "="*80)
+    print("ATTRIBUTION MODEL COMPARISON")
+    print("="*80)
+
+    # Revenue credited to each channel by each model (models in alphabetical order)
+    attribution_comparison = credit['Revenue'].sort_index(axis=1)
+
+    # Calculate percentage of total revenue
+    for col in attribution_comparison.columns:
+        total = attribution_comparison[col].sum()
+        attribution_comparison[f'{col}_Pct'] = (attribution_comparison[col] / total) * 100
+
+    print("\nRevenue Attribution by Model:")
+    print(attribution_comparison.to_string())
+
+    # Save attribution comparison
+    attribution_comparison.to_csv('attribution_model_comparison.csv')
+    print("\n✓ Saved: attribution_model_comparison.csv")
+
+    # ========================================================================
+    # 4. CALCULATE ROI/ROAS BY CHANNEL
+    # ========================================================================
+
+    print("\n\n" + "="*80)
+    print("ROI/ROAS ANALYSIS BY CHANNEL")
+    print("="*80)
+
+    # Simulated marketing spend per session by channel (edit CPA_BY_CHANNEL in funnel_budget.py)
+    cpa_by_channel = CPA_BY_CHANNEL
+
+    roi_df = rollup_funnel(cube, ['channel']).rename(columns={'channel': 'Channel', 'Purchases': 'Conversions'})
+
+    # Calculate spend (unknown channels default to $20 per session)
+    roi_df['Spend'] = roi_df['Sessions'] * session_cost(roi_df['Channel'], cpa_by_channel)
 
     # Calculate metrics
-    cpa = total_spend / conversions if conversions > 0 else 0
-    roas = revenue / total_spend if total_spend > 0 else 0
-    roi = ((revenue - total_spend) / total_spend) * 100 if total_spend > 0 else 0
-
-    roi_metrics.append({
-        'Channel': channel,
-        'Sessions': total_sessions,
-        'Spend': total_spend,
-        'Revenue': revenue,
-        'Conversions': conversions,
-        'CPA': cpa,
-        'ROAS': roas,
-        'ROI': roi
-    })
-
-roi_df = pd.DataFrame(roi_metrics).sort_values('ROAS', ascending=False)
-
-print("\nChannel ROI/ROAS Performance:")
-for _, row in roi_df.iterrows():
-    print(f"\n{row['Channel']}:")
-    print(f"  Total Spend: ${row['Spend']:,.2f}")
-    print(f"  Revenue Generated: ${row['Revenue']:,.2f}")
-    print(f"  ROAS: {row['ROAS']:.2f}x (${row['ROAS']:.2f} revenue per $1 spend)")
-    print(f"  ROI: {row['ROI']:.1f}%")
-    print(f"  CPA: ${row['CPA']:.2f} (cost per acquisition)")
-
-# Save ROI metrics
-roi_df.to_csv('channel_roi_metrics.csv', index=False)
-print("\n✓ Saved: channel_roi_metrics.csv")
-
-# ============================================================================
-# 5. BUDGET ALLOCATION RECOMMENDATIONS
-# ============================================================================
-
-print("\n\n" + "="*80)
-print("BUDGET ALLOCATION OPTIMIZATION")
-print("="*80)
-
-# Current budget allocation (based on session volume)
-total_spend = roi_df['Spend'].sum()
-roi_df['Current_Budget_Share'] = (roi_df['Spend'] / total_spend) * 100
-
-# Optimal allocation based on ROAS
-# Weight by ROAS squared to heavily favor high performers
-roi_df['ROAS_Weight'] = roi_df['ROAS'] ** 2
-total_roas_weight = roi_df['ROAS_Weight'].sum()
-roi_df['Optimal_Budget_Share'] = (roi_df['ROAS_Weight'] / total_roas_weight) * 100
-
-# Calculate budget shift
-roi_df['Budget_Change'] = roi_df['Optimal_Budget_Share'] - roi_df['Current_Budget_Share']
-roi_df['Dollar_Change'] = (roi_df['Budget_Change'] / 100) * total_spend
-
-print("\nCurrent vs Optimal Budget Allocation:")
-print(roi_df[['Channel', 'Current_Budget_Share', 'Optimal_Budget_Share', 'Budget_Change', 'Dollar_Change']].to_string(index=False))
-
-print("\n" + "-"*80)
-print("RECOMMENDATIONS:")
-print("-"*80)
-
-# Channels to increase
-increase_channels = roi_df[roi_df['Budget_Change'] > 5].sort_values('Budget_Change', ascending=False)
-if len(increase_channels) > 0:
-    print("\n🚀 INCREASE INVESTMENT:")
-    for _, channel in increase_channels.iterrows():
-        print(f"   {channel['Channel']}: {channel['Budget_Change']:+.1f}% (${channel['Dollar_Change']:+,.0f})")
-        print(f"      Current ROAS: {channel['ROAS']:.2f}x - High return justifies more spend")
-
-# Channels to decrease
-decrease_channels = roi_df[roi_df['Budget_Change'] < -5].sort_values('Budget_Change')
-if len(decrease_channels) > 0:
-    print("\n⚠️  DECREASE INVESTMENT:")
-    for _, channel in decrease_channels.iterrows():
-        print(f"   {channel['Channel']}: {channel['Budget_Change']:+.1f}% (${channel['Dollar_Change']:+,.0f})")
-        print(f"      Current ROAS: {channel['ROAS']:.2f}x - Underperforming, reallocate budget")
-
-# Projected impact
-current_total_revenue = roi_df['Revenue'].sum()
-weighted_roas = (roi_df['ROAS'] * roi_df['Optimal_Budget_Share'] / 100).sum()
-projected_revenue = total_spend * weighted_roas
-revenue_lift = ((projected_revenue - current_total_revenue) / current_total_revenue) * 100
-
-print(f"\n💡 PROJECTED IMPACT:")
-print(f"   Current Revenue: ${current_total_revenue:,.2f}")
-print(f"   Projected Revenue (optimized): ${projected_revenue:,.2f}")
-print(f"   Expected Lift: {revenue_lift:+.1f}%")
-
-# Save allocation recommendations
-roi_df[['Channel', 'Spend', 'Revenue', 'ROAS', 'ROI', 'Current_Budget_Share', 
-        'Optimal_Budget_Share', 'Budget_Change', 'Dollar_Change']].to_csv('budget_allocation_recommendations.csv', index=False)
-print("\n✓ Saved: budget_allocation_recommendations.csv")
-
-# ============================================================================
-# 6. ATTRIBUTION IMPACT ON DECISIONS
-# ============================================================================
-
-print("\n\n" + "="*80)
-print("ATTRIBUTION MODEL IMPACT ON DECISIONS")
-print("="*80)
-
-print("\nHow attribution model choice affects channel credit:")
-print("\n(Note: In single-touch journeys, most models yield similar results)")
-print("(In multi-touch scenarios, differences would be more pronounced)")
-
-# Compare top 3 channels across models
-print("\nTop 3 Channels by Revenue (First-Touch Model):")
-top3_first = first_touch.nlargest(3, 'Revenue')[['Revenue', 'Conversions']]
-for channel, row in top3_first.iterrows():
-    print(f"  {channel}: ${row['Revenue']:,.2f} ({row['Conversions']} conversions)")
-
-print("\nKey Insight:")
-print("In real multi-touch attribution scenarios:")
-print("  • First-Touch favors awareness channels (upper funnel)")
-print("  • Last-Touch favors conversion channels (lower funnel)")
-print("  • Linear gives balanced view of all touchpoints")
-print("  • Time-Decay emphasizes recent interactions")
-print("  • Position-Based (40-20-40) balances first and last touch")
-
-print("\n" + "="*80)
-print("ATTRIBUTION ANALYSIS COMPLETE")
-print("="*80)
-print("\nGenerated files:")
-print("  - attribution_model_comparison.csv")
-print("  - channel_roi_metrics.csv")
-print("  - budget_allocation_recommendations.csv")
+    roi_df['CPA'] = (roi_df['Spend'] / roi_df['Conversions']).where(roi_df['Conversions'] > 0, 0)
+    roi_df['ROAS'] = (roi_df['Revenue'] / roi_df['Spend']).where(roi_df['Spend'] > 0, 0)
+    roi_df['ROI'] = (((roi_df['Revenue'] - roi_df['Spend']) / roi_df['Spend']) * 100).where(roi_df['Spend'] > 0, 0)
+
+    roi_df = roi_df[['Channel', 'Sessions', 'Spend', 'Revenue', 'Conversions',
+                     'CPA', 'ROAS', 'ROI']].sort_values('ROAS', ascending=False)
+
+    print("\nChannel ROI/ROAS Performance:")
+    for _, row in roi_df.iterrows():
+        print(f"\n{row['Channel']}:")
+        print(f"  Total Spend: ${row['Spend']:,.2f}")
+        print(f"  Revenue Generated: ${row['Revenue']:,.2f}")
+        print(f"  ROAS: {row['ROAS']:.2f}x (${row['ROAS']:.2f} revenue per $1 spend)")
+        print(f"  ROI: {row['ROI']:.1f}%")
+        print(f"  CPA: ${row['CPA']:.2f} (cost per acquisition)")
+
+    # Save ROI metrics
+    roi_df.to_csv('channel_roi_metrics.csv', index=False)
+    print("\n✓ Saved: channel_roi_metrics.csv")
+
+    # Sensitivity of the ROI table to the CPA assumptions - every combination of
+    # the requested cost multipliers in one pass
+    if cost_grids:
+        try:
+            sensitivity = cost_sensitivity(roi_df.set_index('Channel'), cost_grids, cpa_by_channel)
+        except ValueError as error:
+            parser.error(str(error))
+        num_scenarios = sensitivity['Scenario'].nunique()
+        print(f"\nCPA sensitivity: {num_scenarios:,} scenarios over "
+              + ", ".join(f"{channel} x{grid.min():.2f}-{grid.max():.2f}" for channel, grid in cost_grids.items()))
+
+        base_rank = pd.Series(range(1, len(roi_df) + 1), index=roi_df['Channel'].astype(str))
+        rank_changed = sensitivity['ROAS_Rank'] != sensitivity['Channel'].map(base_rank)
+        rank_summary = sensitivity.groupby('Channel')['ROAS_Rank'].agg(['min', 'max'])
+        rank_summary['changed'] = rank_changed.groupby(sensitivity['Channel']).mean()
+        print("ROAS rank by channel (current assumption, range across scenarios):")
+        for channel in base_rank.index:
+            row = rank_summary.loc[channel]
+            print(f"  {channel:20s} #{base_rank[channel]}  (#{row['min']:.0f} - #{row['max']:.0f}, "
+                  f"differs in {row['changed']:.0%} of scenarios)")
+
+        sensitivity.to_csv('cpa_sensitivity.csv', index=False)
+        print("\n✓ Saved: cpa_sensitivity.csv")
+
+    # ========================================================================
+    # 5. BUDGET ALLOCATION RECOMMENDATIONS
+    # ========================================================================
+
+    print("\n\n" + "="*80)
+    print("BUDGET ALLOCATION OPTIMIZATION")
+    print("="*80)
+
+    # Current budget allocation (based on session volume)
+    total_spend = roi_df['Spend'].sum()
+    roi_df['Current_Budget_Share'] = (roi_df['Spend'] / total_spend) * 100
+
+    # Diminishing-returns response curve per channel, fitted to weekly spend and revenue
+    weekly = rollup_funnel(cube, ['channel', 'cohort_week'])
+    weekly['spend'] = weekly['Sessions'] * session_cost(weekly['channel'], cpa_by_channel)
+    weekly['revenue'] = weekly['Revenue']
+    num_weeks = weekly['cohort_week'].nunique()
+    curves = fit_response_curves(weekly[['channel', 'spend', 'revenue']]).loc[roi_df['Channel']]
+
+    print(f"\nResponse curves (revenue = scale x ln(1 + weekly spend / saturation), {num_weeks} weeks):")
+    curve_issues = unreliable_curves(curves, min_r_squared=args.min_curve_r_squared)
+    for channel, curve in curves.iterrows():
+        print(f"  {channel:20s} saturation ${curve['saturation']:>12,.0f}/week   R² {curve['r_squared']:.2f}"
+              + (f"   ⚠️  {curve_issues[channel]}" if curve_issues[channel] else ""))
+
+    # Optimal allocation: same total budget, each channel kept within its spend
+    # bounds, marginal ROAS equalized across the channels in between. Channels
+    # whose curve is unreliable are held at their current spend.
+    current_weekly = roi_df['Spend'].to_numpy() / num_weeks
+    held = (curve_issues != '').to_numpy()
+    if held.all():
+        print("\n⚠️  No channel has a reliable response curve - current allocation kept")
+    elif held.any():
+        print(f"\n⚠️  Unreliable response curves - held at current spend: {', '.join(curves.index[held])}")
+    if held.all():
+        optimal_weekly = pd.Series(current_weekly, index=curves.index)
+    else:
+        try:
+            optimal_weekly = optimize_budget(curves, current_weekly.sum(),
+                                             min_spend=np.where(held, 1, args.min_spend_ratio) * current_weekly,
+                                             max_spend=np.where(held, 1, args.max_spend_ratio) * current_weekly)
+        except ValueError as error:
+            parser.error(str(error))
+    roi_df['Optimal_Budget_Share'] = (optimal_weekly.to_numpy() / optimal_weekly.sum()) * 100
+    roi_df['Marginal_ROAS'] = marginal_roas(curves, optimal_weekly).to_numpy()
+
+    # Calculate budget shift
+    roi_df['Budget_Change'] = roi_df['Optimal_Budget_Share'] - roi_df['Current_Budget_Share']
+    roi_df['Dollar_Change'] = (roi_df['Budget_Change'] / 100) * total_spend
+
+    print("\nCurrent vs Optimal Budget Allocation:")
+    print(roi_df[['Channel', 'Current_Budget_Share', 'Optimal_Budget_Share', 'Budget_Change', 'Dollar_Change']].to_string(index=False))
+
+    print("\n" + "-"*80)
+    print("RECOMMENDATIONS:")
+    print("-"*80)
+
+    # Channels to increase
+    increase_channels = roi_df[roi_df['Budget_Change'] > 5].sort_values('Budget_Change', ascending=False)
+    if len(increase_channels) > 0:
+        print("\n🚀 INCREASE INVESTMENT:")
+        for _, channel in increase_channels.iterrows():
+            print(f"   {channel['Channel']}: {channel['Budget_Change']:+.1f}% (${channel['Dollar_Change']:+,.0f})")
+            print(f"      Current ROAS: {channel['ROAS']:.2f}x - High return justifies more spend "
+                  f"(next dollar returns {channel['Marginal_ROAS']:.2f}x)")
+
+    # Channels to decrease
+    decrease_channels = roi_df[roi_df['Budget_Change'] < -5].sort_values('Budget_Change')
+    if len(decrease_channels) > 0:
+        print("\n⚠️  DECREASE INVESTMENT:")
+        for _, channel in decrease_channels.iterrows():
+            print(f"   {channel['Channel']}: {channel['Budget_Change']:+.1f}% (${channel['Dollar_Change']:+,.0f})")
+            print(f"      Current ROAS: {channel['ROAS']:.2f}x - Underperforming, reallocate budget "
+                  f"(next dollar returns {channel['Marginal_ROAS']:.2f}x)")
+
+    # Projected impact - the curves' revenue change applied to actual revenue
+    current_total_revenue = roi_df['Revenue'].sum()
+    modeled_current = response_revenue(curves, current_weekly).sum()
+    modeled_optimal = response_revenue(curves, optimal_weekly).sum()
+    revenue_lift = ((modeled_optimal - modeled_current) / modeled_current) * 100
+    projected_revenue = current_total_revenue * (1 + revenue_lift / 100)
+
+    print(f"\n💡 PROJECTED IMPACT:")
+    print(f"   Current Revenue: ${current_total_revenue:,.2f}")
+    print(f"   Projected Revenue (optimized): ${projected_revenue:,.2f}")
+    print(f"   Expected Lift: {revenue_lift:+.1f}%")
+
+    # Scenario simulation - the same comparison under uncertain curves and CPAs
+    # (nothing to compare when every channel is held at current spend)
+    if not held.all():
+        scenarios = simulate_scenarios(curves, {'Current': current_weekly, 'Optimized': optimal_weekly.to_numpy()},
+                                       num_samples=args.scenarios, cpa_uncertainty=args.cpa_uncertainty,
+                                       workers=args.workers)
+        optimized = scenarios.loc['Optimized']
+        print(f"\n🎲 SCENARIO SIMULATION ({args.scenarios:,} draws of channel response and CPA):")
+        print(f"   Projected Revenue (optimized): ${current_total_revenue * (1 + optimized['Lift_P5'] / 100):,.2f} - "
+              f"${current_total_revenue * (1 + optimized['Lift_P95'] / 100):,.2f} (90% interval)")
+        print(f"   Lift: {optimized['Lift_P5']:+.1f}% / {optimized['Lift_P50']:+.1f}% / {optimized['Lift_P95']:+.1f}% "
+              f"(5th / 50th / 95th percentile)")
+        print(f"   P(lift > 0): {optimized['P_Lift_Positive']:.1%}")
+
+    # Save allocation recommendations
+    roi_df[['Channel', 'Spend', 'Revenue', 'ROAS', 'ROI', 'Current_Budget_Share', 
+            'Optimal_Budget_Share', 'Budget_Change', 'Dollar_Change', 'Marginal_ROAS']].to_csv('budget_allocation_recommendations.csv', index=False)
+    print("\n✓ Saved: budget_allocation_recommendations.csv")
+
+    # ========================================================================
+    # 6. ATTRIBUTION IMPACT ON DECISIONS
+    # ========================================================================
+
+    print("\n\n" + "="*80)
+    print("ATTRIBUTION MODEL IMPACT ON DECISIONS")
+    print("="*80)
+
+    print("\nHow attribution model choice affects channel credit:")
+    print("\n(Note: In single-touch journeys, most models yield similar results)")
+    print("(In multi-touch scenarios, differences would be more pronounced)")
+
+    # Compare top 3 channels across models
+    print("\nTop 3 Channels by Revenue (First-Touch Model):")
+    top3_first = first_touch.nlargest(3, 'Revenue')[['Revenue', 'Conversions']]
+    for channel, row in top3_first.iterrows():
+        print(f"  {channel}: ${row['Revenue']:,.2f} ({row['Conversions']} conversions)")
+
+    print("\nKey Insight:")
+    print("In real multi-touch attribution scenarios:")
+    print("  • First-Touch favors awareness channels (upper funnel)")
+    print("  • Last-Touch favors conversion channels (lower funnel)")
+    print("  • Linear gives balanced view of all touchpoints")
+    print("  • Time-Decay emphasizes recent interactions")
+    print("  • Position-Based (40-20-40) balances first and last touch")
+    print("  • Markov credits each channel by the conversions lost when it is removed from the journeys")
+    print("  • Shapley averages each channel's marginal contribution over every coalition of channels")
+
+    print("\n" + "="*80)
+    print("ATTRIBUTION ANALYSIS COMPLETE")
+    print("="*80)
+    print("\nGenerated files:")
+    print("  - attribution_model_comparison.csv")
+    print("  - channel_roi_metrics.csv")
+    print("  - budget_allocation_recommendations.csv")
+    if cost_grids:
+        print("  - cpa_sensitivity.csv")
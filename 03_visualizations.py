@@ -4,6 +4,7 @@ Author: Marketing Analytics Project
 Description: Create comprehensive visualizations for funnel analysis and attribution
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -14,13 +15,25 @@ from plotly.subplots import make_subplots
 import warnings
 warnings.filterwarnings('ignore')
 
+from funnel_data import default_data_path
+from funnel_metrics import load_funnel_cube, rollup_cube
+
 # Set style
 sns.set_style("whitegrid")
 sns.set_palette("husl")
 
-# Load data
-print("Loading data for visualizations...")
-df = pd.read_csv('marketing_funnel_data.csv', parse_dates=['landing_timestamp'])
+parser = argparse.ArgumentParser(description='Marketing funnel visualizations')
+parser.add_argument('--data', default=None,
+                    help='Data file or partition directory (default: most recently generated)')
+parser.add_argument('--no-cache', action='store_true',
+                    help='Re-parse the source data instead of using the .funnel_cache/ copy')
+args = parser.parse_args()
+
+# Load data (CSV, Parquet, Feather or partition directory - whichever was generated last)
+data_path = args.data or default_data_path()
+print(f"Loading data for visualizations from {data_path}...")
+# Every chart is a rollup of the funnel cube - no raw sessions are scanned
+cube = load_funnel_cube(data_path, use_cache=not args.no_cache)
 channel_metrics = pd.read_csv('channel_performance_metrics.csv')
 roi_metrics = pd.read_csv('channel_roi_metrics.csv')
 cohort_data = pd.read_csv('cohort_analysis.csv')
@@ -35,11 +48,11 @@ print("\nCreating interactive funnel visualizations...")
 
 # Calculate funnel metrics
 stages = {
-    'Landing Page': df['stage_1_landing'].sum(),
-    'Sign Up': df['stage_2_signup'].sum(),
-    'Product View': df['stage_3_product_view'].sum(),
-    'Add to Cart': df['stage_4_add_to_cart'].sum(),
-    'Purchase': df['stage_5_purchase'].sum()
+    'Landing Page': cube['stage_1_landing'].sum(),
+    'Sign Up': cube['stage_2_signup'].sum(),
+    'Product View': cube['stage_3_product_view'].sum(),
+    'Add to Cart': cube['stage_4_add_to_cart'].sum(),
+    'Purchase': cube['stage_5_purchase'].sum()
 }
 
 stage_names = list(stages.keys())
@@ -167,10 +180,9 @@ print("✓ Created: channel_performance_dashboard.html")
 # ============================================================================
 
 # Create channel x device performance matrix
-channel_device = df.groupby(['channel', 'device']).agg({
-    'user_id': 'count',
-    'stage_5_purchase': 'sum'
-}).reset_index()
+channel_device = rollup_cube(cube, ['channel', 'device'], [
+    'sessions', 'stage_5_purchase'
+]).rename(columns={'sessions': 'user_id'}).reset_index()
 
 channel_device['Conversion_Rate'] = (channel_device['stage_5_purchase'] / 
                                       channel_device['user_id']) * 100
@@ -328,11 +340,11 @@ print("✓ Created: roi_bubble_chart.html")
 # Calculate drop-off rates
 drop_offs = []
 stage_counts = [
-    df['stage_1_landing'].sum(),
-    df['stage_2_signup'].sum(),
-    df['stage_3_product_view'].sum(),
-    df['stage_4_add_to_cart'].sum(),
-    df['stage_5_purchase'].sum()
+    cube['stage_1_landing'].sum(),
+    cube['stage_2_signup'].sum(),
+    cube['stage_3_product_view'].sum(),
+    cube['stage_4_add_to_cart'].sum(),
+    cube['stage_5_purchase'].sum()
 ]
 
 stage_labels = ['Landing', 'Signup', 'Product View', 'Add to Cart', 'Purchase']
@@ -0,0 +1,97 @@
+"""
+Near-Real-Time Funnel Monitoring
+Author: Marketing Analytics Project
+Description: Windowed funnel and channel metrics from a live stage event feed (file tail or local socket)
+"""
+
+import argparse
+import os
+import warnings
+warnings.filterwarnings('ignore')
+
+from funnel_stream import StreamingFunnel, parse_event, socket_events, tail_events
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+WINDOW_MINUTES = 60
+JOURNEY_TIMEOUT_MINUTES = 24 * 60         # Journeys idle this long are closed (and evicted)
+OUTPUT_FILE = 'streaming_funnel_metrics.csv'
+
+
+def parse_args():
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description='Streaming funnel metrics over a stage event feed')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--file', help='Event log to read (CSV: timestamp,user_id,event_type,channel,device,purchase_value)')
+    source.add_argument('--port', type=int, help='Listen for newline-delimited events on this local TCP port')
+    parser.add_argument('--follow', action='store_true',
+                        help='Keep reading events appended to --file (like tail -f)')
+    parser.add_argument('--window-minutes', type=int, default=WINDOW_MINUTES,
+                        help=f'Window length (default: {WINDOW_MINUTES})')
+    parser.add_argument('--slide-minutes', type=int, default=None,
+                        help='Start a window every N minutes for sliding windows (default: tumbling)')
+    parser.add_argument('--journey-timeout-minutes', type=int, default=JOURNEY_TIMEOUT_MINUTES,
+                        help=f'Idle time after which a journey is closed (default: {JOURNEY_TIMEOUT_MINUTES})')
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help=f'CSV that emitted window metrics are appended to (default: {OUTPUT_FILE})')
+    return parser.parse_args()
+
+
+def report(window_df, output):
+    """Print a one-line window summary and append the window's rows to the output CSV"""
+    overall = window_df[window_df['Channel'] == 'All'].iloc[0]
+    drop_offs = overall[[col for col in window_df.columns if col.endswith('Drop-off')]].astype(float)
+
+    summary = (f"{overall['window_start']:%Y-%m-%d %H:%M} - {overall['window_end']:%Y-%m-%d %H:%M} | "
+               f"Sessions: {overall['Sessions']:,} | Purchases: {overall['Purchases']:,} | "
+               f"Revenue: ${overall['Revenue']:,.2f}")
+    if overall['Sessions'] > 0:
+        channels = window_df[window_df['Channel'] != 'All']
+        best = channels.loc[channels['Conversion Rate'].idxmax()]
+        summary += f" | Conversion: {overall['Conversion Rate']:.2f}%"
+        if drop_offs.notna().any():
+            summary += f" | Biggest drop-off: {drop_offs.idxmax().replace(' Drop-off', '')} ({drop_offs.max():.1f}%)"
+        summary += f" | Best channel: {best['Channel']} ({best['Conversion Rate']:.2f}%)"
+    print(summary)
+
+    window_df.to_csv(output, mode='a', header=not os.path.exists(output), index=False)
+
+# ============================================================================
+# STREAM PROCESSING
+# ============================================================================
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    engine = StreamingFunnel(args.window_minutes, args.slide_minutes, args.journey_timeout_minutes)
+    if args.file:
+        print(f"Reading stage events from {args.file}{' (following)' if args.follow else ''}...")
+        lines = tail_events(args.file, follow=args.follow)
+    else:
+        print(f"Listening for stage events on 127.0.0.1:{args.port}...")
+        lines = socket_events(args.port)
+
+    if os.path.exists(args.output):
+        os.remove(args.output)
+
+    windows = 0
+    try:
+        for line in lines:
+            event = parse_event(line)
+            if event is None:
+                continue
+            for window_df in engine.process(*event):
+                report(window_df, args.output)
+                windows += 1
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+    # Close out windows whose journeys are still open
+    for window_df in engine.flush():
+        report(window_df, args.output)
+        windows += 1
+
+    print(f"\n✓ {windows:,} windows emitted to {args.output}")
+    print(f"  Open journeys in memory: {len(engine.users):,} | Ignored events: {engine.ignored_events:,}")
@@ -0,0 +1,81 @@
+"""
+Marketing Mix Modeling
+Author: Marketing Analytics Project
+Description: Weekly channel effects with adstock carry-over and saturation, with bootstrap uncertainty
+"""
+
+import argparse
+import warnings
+warnings.filterwarnings('ignore')
+
+from funnel_data import default_data_path
+from funnel_metrics import load_funnel_cube
+from funnel_mmm import bootstrap_mmm, weekly_channel_series
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+NUM_BOOTSTRAP = 200
+OUTPUT_FILE = 'marketing_mix_model.csv'
+
+
+def parse_args():
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description='Marketing mix model over weekly channel spend and revenue')
+    parser.add_argument('--data', default=None,
+                        help='Data file or partition directory (default: most recently generated)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-parse the source data instead of using the .funnel_cache/ copy')
+    parser.add_argument('--bootstrap', type=int, default=NUM_BOOTSTRAP,
+                        help=f'Bootstrap refits for uncertainty intervals (default: {NUM_BOOTSTRAP})')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Random seed for the bootstrap (default: 42)')
+    parser.add_argument('--output', default=OUTPUT_FILE,
+                        help=f'Channel results CSV (default: {OUTPUT_FILE})')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    data_path = args.data or default_data_path()
+    print(f"Loading funnel cube for {data_path}...")
+    cube = load_funnel_cube(data_path, use_cache=not args.no_cache)
+
+    # ========================================================================
+    # 1. WEEKLY SERIES
+    # ========================================================================
+
+    spend, revenue = weekly_channel_series(cube)
+    print(f"Weekly series: {len(spend)} weeks x {spend.shape[1]} channels, "
+          f"${spend.to_numpy().sum():,.0f} spend, ${revenue.sum():,.0f} revenue")
+
+    # ========================================================================
+    # 2. MODEL FIT AND BOOTSTRAP
+    # ========================================================================
+
+    print("\n" + "="*80)
+    print("MARKETING MIX MODEL")
+    print("="*80)
+    print("\nrevenue[week] = base + Σ coefficient × Hill(adstock(spend))  per channel")
+
+    fit, replicates = bootstrap_mmm(spend, revenue, num_bootstrap=args.bootstrap, seed=args.seed)
+    params = fit['params']
+    print(f"\nFit R²: {fit['r_squared']:.3f} | Base revenue: ${fit['intercept']:,.2f}/week | "
+          f"{args.bootstrap} bootstrap refits")
+
+    intervals = replicates.groupby('channel')['roi'].quantile([0.05, 0.95]).unstack()
+    params['roi_p5'] = intervals[0.05].reindex(params.index)
+    params['roi_p95'] = intervals[0.95].reindex(params.index)
+
+    print("\nChannel Effects:")
+    for channel, row in params.sort_values('contribution', ascending=False).iterrows():
+        print(f"\n{channel}:")
+        print(f"  Adstock decay: {row['decay']:.1f} (carry-over into the next week)")
+        print(f"  Half-saturation: ${row['half_saturation']:,.0f} adstocked spend/week (shape {row['shape']:.1f})")
+        print(f"  Contribution: ${row['contribution']:,.2f} on ${row['spend']:,.2f} spend")
+        print(f"  ROI: {row['roi']:.2f}x (90% interval {row['roi_p5']:.2f}x - {row['roi_p95']:.2f}x)")
+
+    params.to_csv(args.output)
+    print(f"\n✓ Saved: {args.output}")
@@ -0,0 +1,751 @@
+"""
+Multi-Touch Path Attribution Engine
+Author: Marketing Analytics Project
+Description: Rule-based (first, last, linear, time-decay, position-based), Markov and Shapley attribution over flat touchpoint paths
+"""
+
+import os
+from math import factorial
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from funnel_data import read_new_rows, read_new_touchpoints, source_key
+from funnel_metrics import STATE_DIR
+
+# ============================================================================
+# PATHS
+# ============================================================================
+
+SECONDS_PER_DAY = 86400
+
+
+def build_paths(touchpoints_df, conversions_df, null_users=None):
+    """Flat per-touch arrays of every user's ordered touchpoint path
+
+    touchpoints_df has one row per touch (user_id, timestamp, channel);
+    conversions_df has one row per converting user (user_id,
+    conversion_timestamp, purchase_value). Touches after the conversion are
+    ignored, and so are users without a touch before it. null_users, if given,
+    are users whose journey ended without a conversion; all their touches form
+    a null path (no conversion, null_count 1). A journey ends at its
+    conversion, or at its last touch if it never converted (end_time).
+
+    Paths are stored back to back: touches of path p are
+    touch_channel[offsets[p]:offsets[p + 1]], oldest first. Every model below
+    is a handful of whole-array operations over these arrays.
+    """
+    null_users = pd.Index([] if null_users is None else null_users)
+    journey_users = pd.Index(conversions_df['user_id']).append(null_users)
+    num_conversions = len(conversions_df)
+    touch_path = journey_users.get_indexer(touchpoints_df['user_id'])
+    touch_times = touchpoints_df['timestamp'].to_numpy().astype('datetime64[s]')
+    conversion_times = conversions_df['conversion_timestamp'].to_numpy().astype('datetime64[s]')
+
+    keep = touch_path >= 0
+    is_conversion_touch = keep & (touch_path < num_conversions)
+    keep[is_conversion_touch] = (touch_times[is_conversion_touch] <=
+                                 conversion_times[touch_path[is_conversion_touch]])
+    touch_path, touch_times = touch_path[keep], touch_times[keep]
+    channel_codes, channels = pd.factorize(touchpoints_df['channel'].to_numpy()[keep], sort=True)
+
+    order = np.lexsort((touch_times, touch_path))
+    touch_path, touch_times, channel_codes = touch_path[order], touch_times[order], channel_codes[order]
+
+    # Renumber paths densely, dropping journeys without any touch
+    lengths = np.bincount(touch_path, minlength=len(journey_users))
+    has_touch = lengths > 0
+    touch_path = (np.cumsum(has_touch) - 1)[touch_path]
+    lengths = lengths[has_touch]
+    offsets = np.r_[0, np.cumsum(lengths)]
+
+    # Null journeys end at their last touch
+    converted = (np.arange(len(journey_users)) < num_conversions)[has_touch]
+    end_times = touch_times[offsets[1:] - 1]
+    end_times[converted] = conversion_times[has_touch[:num_conversions]]
+    age_seconds = (end_times[touch_path] - touch_times).astype(np.float64)
+
+    revenue = np.zeros(len(lengths))
+    revenue[converted] = conversions_df['purchase_value'].to_numpy(dtype=np.float64)[has_touch[:num_conversions]]
+    return {
+        'channels': pd.Index(channels, name='channel'),
+        'touch_channel': channel_codes.astype(np.int32),
+        'touch_path': touch_path,
+        'touch_age_days': age_seconds / SECONDS_PER_DAY,
+        'offsets': offsets,
+        'conversions': converted.astype(np.float64),
+        'revenue': revenue,
+        'null_count': (~converted).astype(np.float64),
+        'end_time': end_times
+    }
+
+
+# Session columns session_journeys needs
+JOURNEY_COLUMNS = ['user_id', 'channel', 'landing_timestamp', 'stage_5_purchase', 'purchase_value',
+                   'total_journey_minutes']
+
+
+def session_journeys(sessions, touchpoints=None):
+    """Journeys (build_paths) of funnel sessions and, optionally, their touchpoint log
+
+    Purchasers convert at landing + total journey time; every other user is a
+    null journey. Without a touchpoint log each user's single touch is their
+    landing session on the acquisition channel. Raises ValueError when
+    purchasers have no touch before converting, which means the touchpoint
+    log does not belong to these sessions.
+    """
+    purchasers = sessions[sessions['stage_5_purchase'] == 1]
+    conversions = pd.DataFrame({
+        'user_id': purchasers['user_id'],
+        'conversion_timestamp': (purchasers['landing_timestamp'] +
+                                 pd.to_timedelta(purchasers['total_journey_minutes'], unit='m')),
+        'purchase_value': purchasers['purchase_value']
+    })
+    if touchpoints is None:
+        touchpoints = sessions[['user_id', 'landing_timestamp', 'channel']].rename(
+            columns={'landing_timestamp': 'timestamp'})
+    journeys = build_paths(touchpoints, conversions,
+                           null_users=sessions.loc[sessions['stage_5_purchase'] == 0, 'user_id'])
+    missing = len(conversions) - int(journeys['conversions'].sum())
+    if missing:
+        raise ValueError(f"{missing:,} of {len(conversions):,} purchasers have no touchpoint before converting - "
+                         "the touchpoint log does not match the funnel data (regenerate both with "
+                         "00_generate_data.py --touchpoints)")
+    return journeys
+
+
+def dedup_paths(paths):
+    """Collapse paths with the same channel sequence into one path with counts
+
+    Returns paths in the same layout, one per distinct sequence, with
+    conversions, revenue and null_count summed over the journeys it stands for.
+    Every model accepts either form and gives the same credit, but on the
+    deduplicated paths its cost scales with the number of distinct sequences
+    rather than users. The one exception is time-decay: a touch's age becomes
+    the conversion-weighted mean age of that touch position (null-weighted for
+    paths that never convert), so its credit is approximate - attribute_paths
+    takes the journeys as well to keep it exact.
+
+    Sequences are numbered one touch position at a time, trie-style: a path's
+    id after position k is the rank of (its id after position k - 1, its
+    channel at k), so distinct sequences are found exactly without building
+    any per-path keys.
+    """
+    lengths = path_lengths(paths)
+    starts = paths['offsets'][:-1]
+    num_channels = len(paths['channels'])
+
+    prefix = np.zeros(len(lengths), dtype=np.int64)
+    active = np.arange(len(lengths))
+    for position in range(lengths.max(initial=0)):
+        active = active[lengths[active] > position]
+        key = prefix[active] * num_channels + paths['touch_channel'][starts[active] + position]
+        prefix[active] = np.unique(key, return_inverse=True)[1]
+    unique_keys, path_id = np.unique(lengths * (prefix.max(initial=0) + 1) + prefix, return_inverse=True)
+    num_unique = len(unique_keys)
+
+    # One representative journey per distinct sequence supplies its channels
+    representative = np.zeros(num_unique, dtype=np.int64)
+    representative[path_id[::-1]] = np.arange(len(lengths))[::-1]
+    unique_lengths = lengths[representative]
+    unique_offsets = np.r_[0, np.cumsum(unique_lengths)]
+    unique_touch_path = np.repeat(np.arange(num_unique), unique_lengths)
+    position = np.arange(unique_offsets[-1]) - unique_offsets[unique_touch_path]
+    touch_channel = paths['touch_channel'][paths['offsets'][representative][unique_touch_path] + position]
+
+    def total(values):
+        return np.bincount(path_id, values, minlength=num_unique)
+
+    conversions, null_count = total(paths['conversions']), total(paths['null_count'])
+
+    # Mean touch age per (sequence, position)
+    touch_path = paths['touch_path']
+    slot = unique_offsets[path_id][touch_path] + np.arange(len(touch_path)) - paths['offsets'][touch_path]
+    age_weight = np.where(conversions[path_id] > 0, paths['conversions'], paths['null_count'])[touch_path]
+    age_sum = np.bincount(slot, age_weight * paths['touch_age_days'], minlength=len(touch_channel))
+    weight_sum = np.bincount(slot, age_weight, minlength=len(touch_channel))
+
+    return {
+        'channels': paths['channels'],
+        'touch_channel': touch_channel,
+        'touch_path': unique_touch_path,
+        'touch_age_days': age_sum / np.maximum(weight_sum, np.finfo(float).tiny),
+        'offsets': unique_offsets,
+        'conversions': conversions,
+        'revenue': total(paths['revenue']),
+        'null_count': null_count
+    }
+
+
+def select_paths(paths, keep):
+    """The paths where keep is True, in the same layout"""
+    lengths = path_lengths(paths)[keep]
+    touch_keep = keep[paths['touch_path']]
+    selected = {
+        'channels': paths['channels'],
+        'touch_channel': paths['touch_channel'][touch_keep],
+        'touch_path': np.repeat(np.arange(len(lengths)), lengths),
+        'touch_age_days': paths['touch_age_days'][touch_keep],
+        'offsets': np.r_[0, np.cumsum(lengths)],
+        'conversions': paths['conversions'][keep],
+        'revenue': paths['revenue'][keep],
+        'null_count': paths['null_count'][keep]
+    }
+    if 'end_time' in paths:
+        selected['end_time'] = paths['end_time'][keep]
+    return selected
+
+
+def concat_paths(path_list):
+    """Paths of several sources back to back, channels re-encoded on the union of their channels"""
+    channels = pd.Index(sorted(set().union(*(p['channels'] for p in path_list))), name='channel')
+    num_paths = np.cumsum([0] + [len(p['conversions']) for p in path_list])
+
+    def stacked(key):
+        return np.concatenate([p[key] for p in path_list])
+
+    return {
+        'channels': channels,
+        'touch_channel': np.concatenate([channels.get_indexer(p['channels'])[p['touch_channel']]
+                                         for p in path_list]).astype(np.int32),
+        'touch_path': np.concatenate([p['touch_path'] + start for p, start in zip(path_list, num_paths)]),
+        'touch_age_days': stacked('touch_age_days'),
+        'offsets': np.r_[0, np.cumsum(np.concatenate([path_lengths(p) for p in path_list]))],
+        'conversions': stacked('conversions'),
+        'revenue': stacked('revenue'),
+        'null_count': stacked('null_count')
+    }
+
+
+def _scaled(paths, weight):
+    """Paths with conversions, revenue and null_count multiplied by weight (scalar or one per path)"""
+    return {**paths, 'conversions': paths['conversions'] * weight, 'revenue': paths['revenue'] * weight,
+            'null_count': paths['null_count'] * weight}
+
+
+def path_table(paths):
+    """One row per path: channel sequence, conversions, revenue and null_count"""
+    names = np.asarray(paths['channels'], dtype=object)[paths['touch_channel']]
+    offsets = paths['offsets']
+    return pd.DataFrame({
+        'path': [' > '.join(names[offsets[p]:offsets[p + 1]]) for p in range(len(offsets) - 1)],
+        'conversions': paths['conversions'],
+        'revenue': paths['revenue'],
+        'null_count': paths['null_count']
+    })
+
+
+def path_lengths(paths):
+    """Number of touches in each path"""
+    return np.diff(paths['offsets'])
+
+
+def _credit(paths, weights):
+    """Channel totals of per-touch credit weights (each path's weights sum to 1)"""
+    touch_path = paths['touch_path']
+    num_channels = len(paths['channels'])
+    return pd.DataFrame({
+        'Conversions': np.bincount(paths['touch_channel'], weights * paths['conversions'][touch_path],
+                                   minlength=num_channels),
+        'Revenue': np.bincount(paths['touch_channel'], weights * paths['revenue'][touch_path],
+                               minlength=num_channels)
+    }, index=paths['channels'])
+
+
+# ============================================================================
+# RULE-BASED MODELS
+# ============================================================================
+
+def _first_touch_weights(paths):
+    weights = np.zeros(len(paths['touch_channel']))
+    weights[paths['offsets'][:-1]] = 1.0
+    return weights
+
+
+def _last_touch_weights(paths):
+    weights = np.zeros(len(paths['touch_channel']))
+    weights[paths['offsets'][1:] - 1] = 1.0
+    return weights
+
+
+def _linear_weights(paths):
+    return 1.0 / path_lengths(paths)[paths['touch_path']]
+
+
+def _decay_rate(half_life_days, decay_rate):
+    """Per-day exponential decay rate, given directly or as a half-life
+
+    Raises ValueError for a half-life that is not positive or a negative
+    rate, either of which would break or invert the decay.
+    """
+    if decay_rate is None:
+        if not half_life_days > 0:
+            raise ValueError(f"Time-decay half-life must be a positive number of days, got {half_life_days}")
+        return np.log(2) / half_life_days
+    if not decay_rate >= 0:
+        raise ValueError(f"Time-decay rate must be non-negative, got {decay_rate}")
+    return decay_rate
+
+
+def _time_decay_weights(paths, decay_rate):
+    starts = paths['offsets'][:-1]
+    age = paths['touch_age_days']
+    # Measure age from each path's most recent touch so weights cannot all underflow
+    relative_age = age - np.minimum.reduceat(age, starts)[paths['touch_path']]
+    decay = np.exp(-decay_rate * relative_age)
+    return decay / np.add.reduceat(decay, starts)[paths['touch_path']]
+
+
+def _position_based_weights(paths, first_weight, last_weight):
+    touch_path = paths['touch_path']
+    lengths = path_lengths(paths)[touch_path]
+    position = np.arange(len(touch_path)) - paths['offsets'][touch_path]
+    is_first, is_last = position == 0, position == lengths - 1
+
+    middle_weight = (1 - first_weight - last_weight) / np.maximum(lengths - 2, 1)
+    weights = np.where(is_first, first_weight, np.where(is_last, last_weight, middle_weight))
+    ends_total = first_weight + last_weight
+    weights = np.where(lengths == 2, np.where(is_first, first_weight, last_weight) / ends_total, weights)
+    return np.where(lengths == 1, 1.0, weights)
+
+
+def first_touch_attribution(paths):
+    """First-touch: 100% credit to first interaction"""
+    return _credit(paths, _first_touch_weights(paths))
+
+
+def last_touch_attribution(paths):
+    """Last-touch: 100% credit to last interaction before conversion"""
+    return _credit(paths, _last_touch_weights(paths))
+
+
+def linear_attribution(paths):
+    """Linear: Equal credit across all touchpoints"""
+    return _credit(paths, _linear_weights(paths))
+
+
+def time_decay_attribution(paths, half_life_days=7.0, decay_rate=None):
+    """Time-decay: each touch weighted by exp(-decay_rate x days before conversion)
+
+    decay_rate defaults to ln 2 / half_life_days, so a touch's weight halves
+    for every half_life_days between it and the conversion. Weights are one
+    array expression over all touches, normalized per journey with a
+    segmented sum.
+    """
+    return _credit(paths, _time_decay_weights(paths, _decay_rate(half_life_days, decay_rate)))
+
+
+def position_based_attribution(paths, first_weight=0.4, last_weight=0.4):
+    """Position-based (U-shaped): 40% first, 40% last, 20% middle
+
+    Two-touch paths split credit in proportion first_weight : last_weight, and
+    single-touch paths give the one touch full credit.
+    """
+    return _credit(paths, _position_based_weights(paths, first_weight, last_weight))
+
+
+# ============================================================================
+# MARKOV CHAIN MODEL
+# ============================================================================
+
+def _markov_states(paths, order):
+    """State of every touch - its channel plus the order - 1 channels before it on the path
+
+    Returns (state id per touch, channel of each state's most recent touch).
+    """
+    if order < 1:
+        raise ValueError(f"Markov order must be at least 1, got {order}")
+    touch_channel = paths['touch_channel'].astype(np.int64)
+    base = len(paths['channels']) + 1
+    index = np.arange(len(touch_channel))
+    position = index - paths['offsets'][paths['touch_path']]
+
+    key = touch_channel
+    for lag in range(1, order):
+        # Earlier channel shifted by one so 0 can mean "before the path started"
+        earlier = np.where(position >= lag, touch_channel[np.maximum(index - lag, 0)] + 1, 0)
+        key = key * base + earlier
+    state_keys, state = np.unique(key, return_inverse=True)
+    return state, state_keys // base ** (order - 1)
+
+
+def markov_chain(paths, order=1):
+    """Absorbing Markov chain of the paths with start, conversion and null states
+
+    Transient state 0 is the start; touch states follow. Returns (Q, absorb,
+    state_channel): Q is the sparse transient-to-transient transition matrix,
+    absorb has one column per absorbing outcome - expected conversions and
+    revenue per step into the conversion state - and state_channel maps each
+    transient state to its current channel (-1 for the start).
+    """
+    state, state_channel = _markov_states(paths, order)
+    state = state + 1
+    num_states = len(state_channel) + 1
+    touch_path, offsets = paths['touch_path'], paths['offsets']
+    journeys = paths['conversions'] + paths['null_count']
+
+    # Every path runs start -> its touch states -> conversion or null
+    is_first = np.zeros(len(state), dtype=bool)
+    is_first[offsets[:-1]] = True
+    previous = np.where(is_first, 0, np.roll(state, 1))
+    counts = sparse.csr_matrix((journeys[touch_path], (previous, state)), shape=(num_states, num_states))
+
+    last_state = state[offsets[1:] - 1]
+    conversions = np.bincount(last_state, paths['conversions'], minlength=num_states)
+    revenue = np.bincount(last_state, paths['revenue'], minlength=num_states)
+    nulls = np.bincount(last_state, paths['null_count'], minlength=num_states)
+
+    row_total = np.asarray(counts.sum(axis=1)).ravel() + conversions + nulls
+    scale = 1.0 / np.maximum(row_total, np.finfo(float).tiny)
+    Q = sparse.diags(scale) @ counts
+    absorb = np.column_stack([conversions, revenue]) * scale[:, None]
+    return Q.tocsc(), absorb, np.r_[-1, state_channel]
+
+
+def _absorbed_from_start(Q, absorb, removed=None):
+    """Expected conversions and revenue per journey from the start state, solving (I - Q) x = absorb
+
+    States in removed are cut out of the chain: transitions into them go to
+    the null state instead.
+    """
+    if removed is not None:
+        Q = Q @ sparse.diags((~removed).astype(np.float64))
+    identity = sparse.identity(Q.shape[0], format='csc')
+    return spsolve((identity - Q).tocsc(), absorb)[0]
+
+
+def markov_removal_effects(paths, order=1):
+    """Share of conversions (and revenue) lost when each channel is removed from the chain"""
+    Q, absorb, state_channel = markov_chain(paths, order)
+    baseline = _absorbed_from_start(Q, absorb)
+    effects = np.array([
+        1 - _absorbed_from_start(Q, absorb, removed=state_channel == channel) / baseline
+        for channel in range(len(paths['channels']))
+    ])
+    return pd.DataFrame(effects, columns=['Conversions', 'Revenue'], index=paths['channels'])
+
+
+def markov_attribution(paths, order=1):
+    """Markov: credit in proportion to each channel's removal effect
+
+    Conversion probabilities come from a linear solve of the absorbing chain
+    rather than path simulation, and each channel's removal effect from one
+    more solve with its states cut out. Revenue is credited from removal
+    effects on the revenue-weighted chain, so single-touch paths reproduce
+    each channel's own revenue.
+    """
+    return _markov_credit(paths, markov_removal_effects(paths, order))
+
+
+def _markov_credit(paths, effects):
+    """Total conversions and revenue shared out in proportion to the removal effects"""
+    totals = pd.Series({'Conversions': paths['conversions'].sum(), 'Revenue': paths['revenue'].sum()})
+    return effects / effects.sum().where(effects.sum() > 0, 1) * totals
+
+
+# ============================================================================
+# SHAPLEY VALUE MODEL
+# ============================================================================
+
+# Up to this many channels every coalition value is tabulated (2^n rows)
+MAX_EXACT_SHAPLEY_CHANNELS = 16
+
+
+def _path_channel_sets(paths):
+    """Distinct channels of each path as flat (path, channel) arrays plus the path's channel bitmask"""
+    num_channels = len(paths['channels'])
+    pairs = np.unique(paths['touch_path'].astype(np.int64) * num_channels + paths['touch_channel'])
+    member_path, member_channel = pairs // num_channels, pairs % num_channels
+    masks = np.zeros(len(paths['revenue']), dtype=np.int64)
+    np.bitwise_or.at(masks, member_path, np.int64(1) << member_channel)
+    return member_path, member_channel, masks
+
+
+def _exact_shapley(paths, masks):
+    """Exact Shapley values from a table of all 2^n coalition values
+
+    v(S) - conversions and revenue of the paths whose channels all lie in S -
+    is filled by summing paths into their bitmask, then one subset-sum pass
+    per channel. Each channel's value is then a weighted sum over the
+    coalitions without it.
+    """
+    num_channels = len(paths['channels'])
+    num_coalitions = 1 << num_channels
+    values = np.column_stack([np.bincount(masks, paths['conversions'], minlength=num_coalitions),
+                              np.bincount(masks, paths['revenue'], minlength=num_coalitions)])
+    coalitions = np.arange(num_coalitions)
+    sizes = np.zeros(num_coalitions, dtype=np.int64)
+    for channel in range(num_channels):
+        has_channel = (coalitions >> channel) & 1
+        sizes += has_channel
+        with_channel = coalitions[has_channel == 1]
+        values[with_channel] += values[with_channel ^ (1 << channel)]
+
+    weights = np.array([factorial(k) * factorial(num_channels - k - 1) / factorial(num_channels)
+                        for k in range(num_channels)])
+    shapley = np.zeros((num_channels, 2))
+    for channel in range(num_channels):
+        without = coalitions[(coalitions >> channel) & 1 == 0]
+        marginal = values[without | (1 << channel)] - values[without]
+        shapley[channel] = weights[sizes[without]] @ marginal
+    return shapley
+
+
+def _sampled_shapley(paths, member_path, member_channel, tolerance, max_permutations, seed):
+    """Shapley values estimated from random channel orderings
+
+    In one ordering a path's whole value is the marginal contribution of
+    whichever of its channels arrives last, so each batch of orderings is a
+    few array operations over the paths' channel sets. Sampling stops once
+    every channel's standard error is below tolerance x total revenue (and
+    conversions). Returns (estimate, standard error, orderings used).
+    """
+    num_channels = len(paths['channels'])
+    rng = np.random.default_rng(seed)
+    starts = np.flatnonzero(np.r_[True, member_path[1:] != member_path[:-1]])
+    path_values = np.column_stack([paths['conversions'], paths['revenue']])[member_path[starts]]
+    totals = np.maximum(path_values.sum(axis=0), np.finfo(float).tiny)
+    batch_size = max(1, min(1000, (1 << 22) // max(len(member_channel), 1)))
+
+    sums = np.zeros((num_channels, 2))
+    squares = np.zeros((num_channels, 2))
+    used = 0
+    while used < max_permutations:
+        size = min(batch_size, max_permutations - used)
+        orderings = np.argsort(rng.random((size, num_channels)), axis=1)
+        ranks = np.argsort(orderings, axis=1)
+        last_rank = np.maximum.reduceat(ranks[:, member_channel], starts, axis=1)
+        last_channel = np.take_along_axis(orderings, last_rank, axis=1)
+
+        batch_index = (np.arange(size)[:, None] * num_channels + last_channel).ravel()
+        for measure in range(2):
+            credit = np.bincount(batch_index, np.tile(path_values[:, measure], size),
+                                 minlength=size * num_channels).reshape(size, num_channels)
+            sums[:, measure] += credit.sum(axis=0)
+            squares[:, measure] += (credit ** 2).sum(axis=0)
+        used += size
+
+        mean = sums / used
+        standard_error = np.sqrt(np.maximum(squares / used - mean ** 2, 0) / max(used - 1, 1))
+        if used > 1 and (standard_error / totals).max() < tolerance:
+            break
+    return sums / used, standard_error, used
+
+
+def shapley_attribution(paths, max_exact_channels=MAX_EXACT_SHAPLEY_CHANNELS, tolerance=0.001,
+                        max_permutations=100000, seed=0):
+    """Shapley: each channel's average marginal contribution over all coalitions of channels
+
+    A coalition's value is the conversions and revenue of the paths whose
+    channels all belong to it. Up to max_exact_channels the values are exact;
+    above that they are estimated by sampling channel orderings, and the result
+    also carries standard errors (Conversions_SE, Revenue_SE) and the number
+    of orderings used (attrs['permutations']).
+    """
+    member_path, member_channel, masks = _path_channel_sets(paths)
+    if len(paths['channels']) <= max_exact_channels:
+        shapley = _exact_shapley(paths, masks)
+        return pd.DataFrame(shapley, columns=['Conversions', 'Revenue'], index=paths['channels'])
+
+    shapley, standard_error, used = _sampled_shapley(paths, member_path, member_channel, tolerance,
+                                                     max_permutations, seed)
+    credit = pd.DataFrame(np.column_stack([shapley, standard_error]),
+                          columns=['Conversions', 'Revenue', 'Conversions_SE', 'Revenue_SE'],
+                          index=paths['channels'])
+    credit.attrs['permutations'] = used
+    return credit
+
+
+# ============================================================================
+# ALL MODELS IN ONE PASS
+# ============================================================================
+
+ATTRIBUTION_MODELS = ['First-Touch', 'Last-Touch', 'Linear', 'Time-Decay', 'Position-Based', 'Markov', 'Shapley']
+
+
+def attribute_paths(paths, models=ATTRIBUTION_MODELS, half_life_days=7.0, decay_rate=None, first_weight=0.4,
+                    last_weight=0.4, markov_order=1, journeys=None,
+                    max_exact_shapley_channels=MAX_EXACT_SHAPLEY_CHANNELS):
+    """Conversions and revenue credited to each channel by every requested model
+
+    The per-touch weights of all rule-based models are stacked into one matrix
+    and summed into channels by a single sparse product over the touches,
+    instead of one grouping per model. Markov and Shapley credit come from the
+    same path arrays. When paths are deduplicated, pass the per-journey paths
+    they came from as journeys: time-decay, the one model that depends on each
+    touch's own timing, is then computed exactly from those. Returns one
+    column per (measure, model), so result['Revenue'] is the channel x model
+    revenue table. The Markov removal effects behind the credit are kept in
+    result.attrs['markov_removal_effects'] as {measure: {channel: effect}}.
+    When Shapley values are sampled (more than max_exact_shapley_channels
+    channels), their standard errors are kept the same way in
+    result.attrs['shapley_standard_errors'], with the number of orderings in
+    result.attrs['shapley_permutations'].
+    """
+    decay_rate = _decay_rate(half_life_days, decay_rate)
+    rule_based_weights = {
+        'First-Touch': lambda: _first_touch_weights(paths),
+        'Last-Touch': lambda: _last_touch_weights(paths),
+        'Linear': lambda: _linear_weights(paths),
+        'Time-Decay': lambda: _time_decay_weights(paths, decay_rate),
+        'Position-Based': lambda: _position_based_weights(paths, first_weight, last_weight)
+    }
+    unknown = [model for model in models if model not in rule_based_weights and model not in ('Markov', 'Shapley')]
+    if unknown:
+        raise ValueError(f"Unknown attribution model(s): {', '.join(unknown)}")
+
+    credit = {}
+    if journeys is not None and 'Time-Decay' in models:
+        credit['Time-Decay'] = _credit(journeys, _time_decay_weights(journeys, decay_rate))
+        del rule_based_weights['Time-Decay']
+    rule_based = [model for model in models if model in rule_based_weights]
+    if rule_based:
+        num_touches = len(paths['touch_channel'])
+        weights = np.empty((num_touches, len(rule_based)))
+        for i, model in enumerate(rule_based):
+            weights[:, i] = rule_based_weights[model]()
+        # One-hot touch -> channel matrix; in CSC form it needs no sorting to build
+        by_channel = sparse.csc_matrix((np.ones(num_touches), paths['touch_channel'], np.arange(num_touches + 1)),
+                                       shape=(len(paths['channels']), num_touches))
+        conversions = by_channel @ (weights * paths['conversions'][paths['touch_path'], None])
+        revenue = by_channel @ (weights * paths['revenue'][paths['touch_path'], None])
+        for i, model in enumerate(rule_based):
+            credit[model] = pd.DataFrame({'Conversions': conversions[:, i], 'Revenue': revenue[:, i]},
+                                         index=paths['channels'])
+
+    if 'Markov' in models:
+        removal_effects = markov_removal_effects(paths, order=markov_order)
+        credit['Markov'] = _markov_credit(paths, removal_effects)
+    if 'Shapley' in models:
+        shapley = shapley_attribution(paths, max_exact_channels=max_exact_shapley_channels)
+        credit['Shapley'] = shapley[['Conversions', 'Revenue']]
+
+    result = pd.concat({model: credit[model] for model in models}, axis=1, names=['Attribution_Model', 'Measure'])
+    result = result.swaplevel(axis=1).sort_index(axis=1, level='Measure', sort_remaining=False)
+    if 'Markov' in models:
+        result.attrs['markov_removal_effects'] = removal_effects.to_dict()
+    if 'Shapley' in models:
+        result.attrs['shapley_permutations'] = shapley.attrs.get('permutations')
+        if 'Conversions_SE' in shapley:
+            result.attrs['shapley_standard_errors'] = shapley[['Conversions_SE', 'Revenue_SE']].rename(
+                columns={'Conversions_SE': 'Conversions', 'Revenue_SE': 'Revenue'}).to_dict()
+    return result
+
+
+# ============================================================================
+# INCREMENTAL STATE
+# ============================================================================
+
+class AttributionState:
+    """Deduplicated path counts of every journey merged so far, for incremental attribution
+
+    Every model - Markov transition counts included, for any order - is a
+    function of the path counts, so paths() stands in for the deduplicated
+    journeys and the models cost O(distinct paths) however long the history.
+    Journeys are bucketed by the day they ended. With window_days only
+    journeys ending in the last window_days days before the newest one are
+    kept, one batch per day; with half_life_days a journey's counts halve
+    every half_life_days days before the newest end day. Without a window the
+    batches are folded into one running total on every merge. Raises
+    ValueError unless both are positive when given.
+    """
+
+    def __init__(self, window_days=None, half_life_days=None):
+        if window_days is not None and not window_days > 0:
+            raise ValueError(f"State window must be a positive number of days, got {window_days}")
+        if half_life_days is not None and not half_life_days > 0:
+            raise ValueError(f"State half-life must be a positive number of days, got {half_life_days}")
+        self.window_days = window_days
+        self.half_life_days = half_life_days
+        self.batches = {}       # end day -> deduplicated paths of the journeys ending that day
+        self.newest_day = None  # latest journey end day merged so far
+
+    def _weight(self, day):
+        if self.half_life_days is None:
+            return 1.0
+        return 0.5 ** ((self.newest_day - day) / np.timedelta64(1, 'D') / self.half_life_days)
+
+    def merge(self, journeys):
+        """Fold new journeys (build_paths) into the counts; returns how many were merged"""
+        if len(journeys['end_time']) == 0:
+            return 0
+        end_day = journeys['end_time'].astype('datetime64[D]')
+        previous_day = self.newest_day
+        self.newest_day = end_day.max() if previous_day is None else max(previous_day, end_day.max())
+
+        if self.window_days is None:
+            folded = [_scaled(batch, self._weight(day)) for day, batch in self.batches.items()]
+            self.batches = {self.newest_day: dedup_paths(concat_paths(
+                folded + [_scaled(journeys, self._weight(end_day))]))}
+            return len(end_day)
+
+        first_day = self.newest_day - np.timedelta64(self.window_days - 1, 'D')
+        for day in np.unique(end_day[end_day >= first_day]):
+            batch = dedup_paths(select_paths(journeys, end_day == day))
+            if day in self.batches:
+                batch = dedup_paths(concat_paths([self.batches[day], batch]))
+            self.batches[day] = batch
+        self.batches = {day: batch for day, batch in self.batches.items() if day >= first_day}
+        return int((end_day >= first_day).sum())
+
+    def paths(self):
+        """Deduplicated paths of the retained journeys, decay-weighted - accepted by every model
+
+        Empty (no paths, no channels) before anything was merged.
+        """
+        if not self.batches:
+            return {
+                'channels': pd.Index([], name='channel'),
+                'touch_channel': np.zeros(0, dtype=np.int32),
+                'touch_path': np.zeros(0, dtype=np.int64),
+                'touch_age_days': np.zeros(0),
+                'offsets': np.zeros(1, dtype=np.int64),
+                'conversions': np.zeros(0),
+                'revenue': np.zeros(0),
+                'null_count': np.zeros(0)
+            }
+        return dedup_paths(concat_paths([_scaled(batch, self._weight(day)) for day, batch in self.batches.items()]))
+
+
+def update_attribution_state(path, touchpoints_path=None, window_days=None, half_life_days=None):
+    """Fold journeys added to a data source since the last run into its on-disk attribution state
+
+    Like update_funnel_state, only session and touchpoint rows appended since
+    the previous call are read (their byte offsets and tail digests are kept
+    with the state), so the cost scales with the new data. A user's session and
+    touches are expected to be appended in the same run. The state is rebuilt
+    from the full sources when there is none yet, when a file was rewritten
+    rather than appended to, or when the touchpoint log, window or half-life
+    changed. Returns (state, number of journeys merged).
+    """
+    state_file = os.path.join(STATE_DIR, f'attribution-{source_key(path)}.pkl')
+    stored = pd.read_pickle(state_file) if os.path.exists(state_file) else None
+    settings = {'touchpoints': touchpoints_path, 'window_days': window_days, 'half_life_days': half_life_days}
+    if stored is not None and stored['settings'] != settings:
+        stored = None
+
+    def read_new(positions):
+        sessions, session_positions = read_new_rows(path, JOURNEY_COLUMNS, positions['sessions'])
+        touchpoints, touchpoint_positions = None, {}
+        if touchpoints_path:
+            touchpoints, touchpoint_positions = read_new_touchpoints(touchpoints_path, positions['touchpoints'])
+        if sessions is None or touchpoint_positions is None:
+            return None, None, None
+        return sessions, touchpoints, {'sessions': session_positions, 'touchpoints': touchpoint_positions}
+
+    sessions, touchpoints, positions = read_new(stored['positions'] if stored else {'sessions': {}, 'touchpoints': {}})
+    if positions is None:
+        stored = None
+        sessions, touchpoints, positions = read_new({'sessions': {}, 'touchpoints': {}})
+
+    state = stored['state'] if stored else AttributionState(window_days, half_life_days)
+    merged = state.merge(session_journeys(sessions, touchpoints))
+
+    # Write then rename, so an interrupted run never leaves a half-written state
+    os.makedirs(STATE_DIR, exist_ok=True)
+    pd.to_pickle({'source': path, 'settings': settings, 'state': state, 'positions': positions},
+                 state_file + '.tmp')
+    os.replace(state_file + '.tmp', state_file)
+    return state, merged
@@ -0,0 +1,336 @@
+"""
+Budget Allocation Engine
+Author: Marketing Analytics Project
+Description: Diminishing-returns response curves per channel, constrained budget allocation and scenario simulation
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# ============================================================================
+# CHANNEL COSTS
+# ============================================================================
+
+# Simulated marketing spend per session by channel (cost per acquisition varies
+# by channel). These are realistic industry averages
+CPA_BY_CHANNEL = {
+    'Organic Search': 15,    # Lower cost (SEO investment amortized)
+    'Paid Search': 35,       # Higher CPC
+    'Social Media': 28,      # Mid-range
+    'Email': 5,              # Very low marginal cost
+    'Direct': 8,             # Brand awareness spillover
+    'Referral': 12           # Partnership costs
+}
+
+DEFAULT_CPA = 20             # Channels missing from the table
+
+
+def session_cost(channels, cpa_by_channel=None):
+    """Cost per session of each row's channel"""
+    cpa_by_channel = CPA_BY_CHANNEL if cpa_by_channel is None else cpa_by_channel
+    return channels.astype(str).map(cpa_by_channel).fillna(DEFAULT_CPA)
+
+
+# ============================================================================
+# COST SENSITIVITY
+# ============================================================================
+
+def parse_cost_grid(spec):
+    """Channel and cost multipliers from 'Paid Search=0.7:1.3:7' (low:high:steps) or 'Email=0.5,1,2'
+
+    Raises ValueError naming the offending part of the spec.
+    """
+    channel, separator, values = spec.partition('=')
+    channel = channel.strip()
+    if not separator or not channel or not values.strip():
+        raise ValueError(f"Cost grid '{spec}' should look like CHANNEL=LOW:HIGH:STEPS or CHANNEL=M1,M2,...")
+
+    def number(token, kind=float):
+        try:
+            return kind(token)
+        except ValueError:
+            raise ValueError(f"Cost grid '{spec}': '{token.strip()}' is not a valid "
+                             f"{'step count' if kind is int else 'multiplier'}") from None
+
+    if ':' in values:
+        bounds = values.split(':')
+        if len(bounds) != 3:
+            raise ValueError(f"Cost grid '{spec}': range '{values.strip()}' should be LOW:HIGH:STEPS")
+        steps = number(bounds[2], int)
+        if steps < 1:
+            raise ValueError(f"Cost grid '{spec}': step count {steps} should be at least 1")
+        multipliers = np.linspace(number(bounds[0]), number(bounds[1]), steps)
+    else:
+        multipliers = np.array([number(value) for value in values.split(',')])
+    if (multipliers <= 0).any() or not np.isfinite(multipliers).all():
+        raise ValueError(f"Cost grid '{spec}': multipliers must be positive")
+    return channel, multipliers
+
+
+def cost_sensitivity(channel_metrics, cost_grids, cpa_by_channel=None):
+    """Spend, ROAS, ROI and CPA of every channel under every combination of cost multipliers
+
+    channel_metrics has one row per channel (index) with Sessions, Revenue and
+    Conversions. cost_grids maps a channel to multipliers of its cost per
+    session; the scenarios are every combination of them, with other channels
+    at their listed cost. All scenarios are one broadcast over a scenarios x
+    channels multiplier matrix. Returns a tidy table with one row per scenario
+    and channel: the scenario's multipliers, Spend, ROAS, ROI, CPA and
+    ROAS_Rank (1 = best ROAS in that scenario).
+    """
+    channels = channel_metrics.index.astype(str)
+    unknown = [channel for channel in cost_grids if channel not in channels]
+    if unknown:
+        raise ValueError(f"Unknown channel(s) in cost grid: {', '.join(unknown)}; "
+                         f"valid channels: {', '.join(channels)}")
+
+    grid_channels = list(cost_grids)
+    combinations = np.stack(np.meshgrid(*[np.asarray(cost_grids[channel], dtype=np.float64)
+                                          for channel in grid_channels], indexing='ij'),
+                            axis=-1).reshape(-1, len(grid_channels))
+    multipliers = np.ones((len(combinations), len(channels)))
+    multipliers[:, channels.get_indexer(grid_channels)] = combinations
+
+    sessions = channel_metrics['Sessions'].to_numpy(dtype=np.float64)
+    revenue = channel_metrics['Revenue'].to_numpy(dtype=np.float64)
+    conversions = channel_metrics['Conversions'].to_numpy(dtype=np.float64)
+    spend = sessions * session_cost(pd.Series(channels), cpa_by_channel).to_numpy(dtype=np.float64) * multipliers
+
+    has_spend = spend > 0
+    roas = np.divide(revenue, spend, out=np.zeros_like(spend), where=has_spend)
+    roi = np.divide(revenue - spend, spend, out=np.zeros_like(spend), where=has_spend) * 100
+    cpa = np.divide(spend, conversions, out=np.zeros_like(spend), where=conversions > 0)
+    roas_rank = (-roas).argsort(axis=1, kind='stable').argsort(axis=1) + 1
+
+    num_scenarios, num_channels = spend.shape
+    table = pd.DataFrame({'Scenario': np.repeat(np.arange(num_scenarios), num_channels),
+                          'Channel': np.tile(channels, num_scenarios)})
+    for channel, values in zip(grid_channels, combinations.T):
+        table[f'{channel}_Cost_Multiplier'] = np.repeat(values, num_channels)
+    table['Spend'] = spend.ravel()
+    table['ROAS'] = roas.ravel()
+    table['ROI'] = roi.ravel()
+    table['CPA'] = cpa.ravel()
+    table['ROAS_Rank'] = roas_rank.ravel()
+    return table
+
+
+# ============================================================================
+# RESPONSE CURVES
+# ============================================================================
+
+# revenue(spend) = scale * ln(1 + spend / saturation): concave, so every extra
+# dollar returns less than the one before; a large saturation is close to linear
+
+def response_revenue(curves, spend):
+    """Revenue each channel's curve predicts at the given spend"""
+    return curves['scale'] * np.log1p(spend / curves['saturation'])
+
+
+def marginal_roas(curves, spend):
+    """Revenue returned by the next dollar of spend on each channel"""
+    return curves['scale'] / (curves['saturation'] + spend)
+
+
+# Saturation grid, as multiples of a channel's mean spend, and how often (and
+# by how much) it is widened when the best fit lands on one of its edges
+SATURATION_GRID_RANGE = (0.05, 1000.0)
+MAX_GRID_WIDENINGS = 3
+GRID_WIDENING_FACTOR = 100.0
+
+# Fit-quality floor for a curve to drive an allocation: the share of weekly
+# revenue variance it explains, and the largest saturation, as a multiple of
+# mean spend, before the curve is a straight line over any spend the
+# optimizer can choose (its slope changes by under 1% per 1x of mean spend)
+MIN_CURVE_R_SQUARED = 0.3
+MAX_SATURATION_TO_SPEND = 100.0
+
+
+def fit_response_curves(observations, grid_size=60):
+    """Least-squares log response curve per channel from (channel, spend, revenue) observations
+
+    Each row is one channel's spend and revenue over one period. For every
+    candidate saturation on a log grid around the channel's typical spend the
+    best scale has a closed form, so the fit is a few array operations per
+    channel rather than an iterative solve. When the best saturation is the
+    smallest or largest candidate the grid is widened on that side and the fit
+    repeated; at_grid_edge marks channels still on an edge after that (the
+    data shows no usable curvature). Returns one row per channel with scale,
+    its standard error scale_se, saturation, r_squared, at_grid_edge and the
+    channel's mean_spend per period.
+    """
+    curves = {}
+    for channel, rows in observations.groupby('channel', observed=True, sort=False):
+        spend = rows['spend'].to_numpy(dtype=np.float64)
+        revenue = rows['revenue'].to_numpy(dtype=np.float64)
+        low, high = SATURATION_GRID_RANGE
+        for widening in range(MAX_GRID_WIDENINGS + 1):
+            saturations = max(spend.mean(), 1.0) * np.geomspace(low, high, grid_size)
+            features = np.log1p(spend[None, :] / saturations[:, None])
+            scales = np.maximum((features @ revenue) / np.maximum((features ** 2).sum(axis=1), 1e-12), 0)
+            errors = ((scales[:, None] * features - revenue) ** 2).sum(axis=1)
+            best = errors.argmin()
+            at_grid_edge = best in (0, grid_size - 1)
+            if not at_grid_edge or widening == MAX_GRID_WIDENINGS:
+                break
+            if best == 0:
+                low /= GRID_WIDENING_FACTOR
+            else:
+                high *= GRID_WIDENING_FACTOR
+
+        total_variance = ((revenue - revenue.mean()) ** 2).sum()
+        residual_variance = errors[best] / max(len(revenue) - 1, 1)
+        curves[channel] = {
+            'scale': scales[best],
+            'scale_se': np.sqrt(residual_variance / max((features[best] ** 2).sum(), 1e-12)),
+            'saturation': saturations[best],
+            'r_squared': 1 - errors[best] / total_variance if total_variance > 0 else 0.0,
+            'at_grid_edge': at_grid_edge,
+            'mean_spend': spend.mean()
+        }
+    return pd.DataFrame.from_dict(curves, orient='index').rename_axis('channel')
+
+
+def unreliable_curves(curves, min_r_squared=MIN_CURVE_R_SQUARED, max_saturation_to_spend=MAX_SATURATION_TO_SPEND):
+    """Why each channel's fitted curve should not drive an allocation (empty string when it can)
+
+    A curve is unreliable when its saturation sits on the grid edge, when it
+    explains less than min_r_squared of the revenue variance, or when its
+    saturation is over max_saturation_to_spend times the channel's mean spend
+    (effectively linear, so it would pull budget without limit).
+    """
+    edge = np.where(curves['at_grid_edge'], 'saturation at grid edge', '')
+    poor_fit = np.where(curves['r_squared'] < min_r_squared, f'R² < {min_r_squared:g}', '')
+    linear = np.where(curves['saturation'] > max_saturation_to_spend * curves['mean_spend'],
+                      f'saturation > {max_saturation_to_spend:g}x mean spend', '')
+    return pd.Series([', '.join(filter(None, reasons)) for reasons in zip(edge, poor_fit, linear)],
+                     index=curves.index)
+
+
+# ============================================================================
+# CONSTRAINED ALLOCATION
+# ============================================================================
+
+def optimize_budget(curves, total_budget, min_spend=None, max_spend=None, tolerance=1e-9):
+    """Spend per channel that maximizes total curve revenue for a fixed budget
+
+    Each channel's spend must stay within [min_spend, max_spend] (Series or
+    scalars; default 0 and unbounded). The curves are concave, so the optimum
+    equalizes marginal ROAS across channels that are not at a bound: for a
+    common marginal return m each channel spends scale / m - saturation,
+    clipped to its bounds. Total spend falls as m rises, so m is found by
+    bisection - a few dozen vectorized steps however many channels there are.
+    """
+    scale = curves['scale'].to_numpy(dtype=np.float64)
+    saturation = curves['saturation'].to_numpy(dtype=np.float64)
+    lower = np.broadcast_to(np.asarray(0.0 if min_spend is None else min_spend, dtype=np.float64), scale.shape)
+    upper = np.broadcast_to(np.asarray(np.inf if max_spend is None else max_spend, dtype=np.float64), scale.shape)
+    if lower.sum() > total_budget * (1 + tolerance) or upper.sum() < total_budget * (1 - tolerance):
+        raise ValueError(f"Budget ${total_budget:,.2f} is outside the spend bounds "
+                         f"(${lower.sum():,.2f} - ${upper.sum():,.2f})")
+
+    def spend_at(marginal):
+        return np.clip(scale / marginal - saturation, lower, upper)
+
+    # Bracket the marginal return: at the low end every channel is at its upper
+    # bound (or the budget is exceeded), at the high end every channel is at its lower bound
+    low = high = max((scale / (saturation + lower)).max(), np.finfo(float).tiny)
+    while spend_at(low).sum() < total_budget and low > np.finfo(float).tiny:
+        low /= 2
+    for _ in range(200):
+        marginal = np.sqrt(low * high)
+        if spend_at(marginal).sum() > total_budget:
+            low = marginal
+        else:
+            high = marginal
+        if high / low - 1 < tolerance:
+            break
+
+    spend = spend_at(high)
+    # Hand any rounding remainder to channels with room left, in proportion to their room
+    remainder = total_budget - spend.sum()
+    room = np.where(remainder > 0, upper - spend, spend - lower)
+    room = np.where(np.isfinite(room), room, total_budget)
+    if room.sum() > 0:
+        spend = spend + remainder * room / room.sum()
+    return pd.Series(spend, index=curves.index, name='spend')
+
+
+# ============================================================================
+# SCENARIO SIMULATION
+# ============================================================================
+
+# Parameter draws per shard; shards are the unit of work for the process pool
+SCENARIO_SHARD_SIZE = 10000
+
+
+def _simulate_shard(scale, scale_cv, saturation, allocations, cpa_uncertainty, num_samples, seed_sequence):
+    """Revenue of every allocation under num_samples joint draws of the channel parameters
+
+    Each draw perturbs every channel's curve scale (lognormal, mean-preserving,
+    spread from the fit's standard error) and its cost per session (lognormal
+    around the assumed CPA). A dearer session means each dollar buys fewer
+    sessions, which stretches the curve's saturation by the same factor.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    num_channels = len(scale)
+    scales = scale * np.exp(scale_cv * rng.standard_normal((num_samples, num_channels)) - scale_cv ** 2 / 2)
+    saturations = saturation * np.exp(cpa_uncertainty * rng.standard_normal((num_samples, num_channels)))
+
+    # Blocks of draws x allocations x channels, a few million values at a time
+    revenue = np.empty((num_samples, len(allocations)))
+    block = max(1, (1 << 22) // (len(allocations) * num_channels))
+    for start in range(0, num_samples, block):
+        rows = slice(start, start + block)
+        revenue[rows] = np.einsum('sc,skc->sk', scales[rows],
+                                  np.log1p(allocations[None, :, :] / saturations[rows, None, :]))
+    return revenue
+
+
+def simulate_scenarios(curves, allocations, num_samples=100000, cpa_uncertainty=0.2, seed=42, workers=1):
+    """Distribution of revenue and lift for candidate allocations under parameter uncertainty
+
+    allocations maps a scenario name to spend per channel (aligned with
+    curves); the first one is the baseline lift is measured against. All
+    allocations are evaluated on the same joint draws, so their lifts are
+    paired. Draws are split into fixed-size shards with their own random
+    streams spawned from seed, so results depend on seed alone - never on
+    workers. With workers > 1 shards run in a process pool.
+
+    Returns one row per allocation with revenue percentiles (P5/P50/P95,
+    in the curves' units per period), lift percentiles against the baseline
+    and the probability that lift is positive. Raises ValueError unless
+    num_samples and workers are at least 1.
+    """
+    if num_samples < 1 or workers < 1:
+        raise ValueError(f"Scenario simulation needs at least one draw and one worker, "
+                         f"got {num_samples} draws and {workers} workers")
+    names = list(allocations)
+    spend = np.vstack([np.asarray(allocations[name], dtype=np.float64) for name in names])
+    scale = curves['scale'].to_numpy(dtype=np.float64)
+    scale_cv = np.divide(curves['scale_se'].to_numpy(dtype=np.float64), scale,
+                         out=np.zeros_like(scale), where=scale > 0)
+    saturation = curves['saturation'].to_numpy(dtype=np.float64)
+
+    shard_sizes = [min(SCENARIO_SHARD_SIZE, num_samples - start) for start in range(0, num_samples, SCENARIO_SHARD_SIZE)]
+    shard_seeds = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+    shard_args = [(scale, scale_cv, saturation, spend, cpa_uncertainty, size, shard_seed)
+                  for size, shard_seed in zip(shard_sizes, shard_seeds)]
+    if workers == 1:
+        shards = [_simulate_shard(*args) for args in shard_args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(_simulate_shard, *zip(*shard_args)))
+    revenue = np.concatenate(shards)
+    lift = revenue / np.maximum(revenue[:, [0]], np.finfo(float).tiny) - 1
+
+    percentiles = [5, 50, 95]
+    summary = pd.DataFrame(index=pd.Index(names, name='scenario'))
+    for p, values in zip(percentiles, np.percentile(revenue, percentiles, axis=0)):
+        summary[f'Revenue_P{p}'] = values
+    for p, values in zip(percentiles, np.percentile(lift, percentiles, axis=0)):
+        summary[f'Lift_P{p}'] = values * 100
+    summary['P_Lift_Positive'] = (lift > 0).mean(axis=0)
+    return summary
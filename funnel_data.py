@@ -0,0 +1,480 @@
+"""
+Marketing Funnel Data Schema & Storage
+Author: Marketing Analytics Project
+Description: Typed schema, writers and loaders for marketing_funnel_data (CSV, Parquet, Feather, partitions)
+"""
+
+import glob
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# ============================================================================
+# SCHEMA
+# ============================================================================
+
+DATA_BASENAME = 'marketing_funnel_data'
+EVENTS_BASENAME = 'marketing_funnel_events'
+TOUCHPOINTS_BASENAME = 'marketing_funnel_touchpoints'
+DATA_FORMATS = ['csv', 'parquet', 'feather']
+
+# Output column order of marketing_funnel_data
+FUNNEL_COLUMNS = [
+    'user_id', 'channel', 'device', 'age_group', 'location', 'cohort_week', 'cohort_month',
+    'stage_1_landing', 'landing_timestamp',
+    'stage_2_signup', 'signup_timestamp', 'landing_to_signup_minutes',
+    'stage_3_product_view', 'product_view_timestamp', 'signup_to_product_minutes',
+    'stage_4_add_to_cart', 'add_to_cart_timestamp', 'product_to_cart_minutes',
+    'stage_5_purchase', 'exit_stage', 'purchase_timestamp', 'cart_to_purchase_minutes',
+    'purchase_value', 'total_journey_minutes'
+]
+
+STAGE_COLUMNS = ['stage_1_landing', 'stage_2_signup', 'stage_3_product_view',
+                 'stage_4_add_to_cart', 'stage_5_purchase']
+
+TIMESTAMP_COLUMNS = ['landing_timestamp', 'signup_timestamp', 'product_view_timestamp',
+                     'add_to_cart_timestamp', 'purchase_timestamp']
+
+# Long-format stage event log: one row per stage a user reached, ordered by time
+EVENT_TYPES = ['landing', 'signup', 'product_view', 'add_to_cart', 'purchase']
+EVENT_COLUMNS = ['timestamp', 'user_id', 'event_type', 'channel', 'device', 'purchase_value']
+TOUCHPOINT_COLUMNS = ['user_id', 'timestamp', 'channel']
+
+# Compact dtypes: low-cardinality text is dictionary-encoded, flags are int8 and
+# timestamps are datetime64; measures stay float64 so results match the CSV path
+COLUMN_DTYPES = {
+    'user_id': 'string',
+    'channel': 'category',
+    'device': 'category',
+    'age_group': 'category',
+    'location': 'category',
+    'cohort_week': 'int16',
+    'cohort_month': 'category',
+    'exit_stage': 'category',
+    'landing_to_signup_minutes': 'float64',
+    'signup_to_product_minutes': 'float64',
+    'product_to_cart_minutes': 'float64',
+    'cart_to_purchase_minutes': 'float64',
+    'purchase_value': 'float64',
+    'total_journey_minutes': 'float64',
+    **{col: 'int8' for col in STAGE_COLUMNS}
+}
+
+
+def apply_schema(df):
+    """Cast funnel columns to the compact schema dtypes (columns not present are skipped)"""
+    df = df.copy()
+    for col, dtype in COLUMN_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category' and isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Keep only observed categories, sorted, as a CSV round trip would
+            categories = df[col].cat.remove_unused_categories()
+            df[col] = categories.cat.reorder_categories(sorted(categories.cat.categories))
+        else:
+            df[col] = df[col].astype(dtype)
+    for col in TIMESTAMP_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def data_format(path):
+    """Storage format implied by a file extension (directories hold partitions)"""
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return extension if extension in DATA_FORMATS else 'csv'
+
+
+# ============================================================================
+# WRITERS
+# ============================================================================
+
+def write_funnel_data(funnel_df, path):
+    """Write the funnel dataset as CSV or a typed columnar file (Parquet/Feather)"""
+    fmt = data_format(path)
+    if fmt == 'csv':
+        funnel_df.to_csv(path, index=False)
+    elif fmt == 'parquet':
+        apply_schema(funnel_df).to_parquet(path, index=False, compression='zstd')
+    else:
+        apply_schema(funnel_df).reset_index(drop=True).to_feather(path, compression='zstd')
+
+
+def partition_path(output_dir, value, fmt='csv', part=None, partition_col='cohort_month'):
+    """File for one partition, e.g. marketing_funnel_data/cohort_month=2024-01.csv
+
+    CSV partitions are appended to in place; columnar formats cannot be appended,
+    so each chunk writes its own numbered part file per partition.
+    """
+    name = f'{partition_col}={value}'
+    if part is not None:
+        name += f'-part{part:05d}'
+    return os.path.join(output_dir, f'{name}.{fmt}')
+
+
+def clear_partitions(output_dir, partition_col='cohort_month'):
+    """Create output_dir and remove partition files left by a previous run"""
+    os.makedirs(output_dir, exist_ok=True)
+    for fmt in DATA_FORMATS:
+        for path in glob.glob(os.path.join(output_dir, f'{partition_col}=*.{fmt}')):
+            os.remove(path)
+
+
+def write_partitions(funnel_df, output_dir, fmt='csv', part=0, partition_col='cohort_month'):
+    """Write one chunk into per-partition files (CSV appends; columnar writes part files)"""
+    for value, partition_df in funnel_df.groupby(partition_col, observed=True, sort=False):
+        if fmt == 'csv':
+            path = partition_path(output_dir, value, fmt, partition_col=partition_col)
+            partition_df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        else:
+            write_funnel_data(partition_df, partition_path(output_dir, value, fmt, part, partition_col))
+
+
+# ============================================================================
+# EVENT LOG
+# ============================================================================
+
+def to_event_log(funnel_df):
+    """Long-format stage events of wide funnel rows: one row per stage reached, sorted by time
+
+    Ties on timestamp are ordered by stage, then by the order of funnel_df.
+    """
+    frames = []
+    for stage, (event_type, flag, ts_col) in enumerate(zip(EVENT_TYPES, STAGE_COLUMNS, TIMESTAMP_COLUMNS)):
+        reached = funnel_df[flag].to_numpy() == 1
+        frames.append(pd.DataFrame({
+            'timestamp': funnel_df[ts_col].to_numpy()[reached],
+            'user_id': funnel_df['user_id'].to_numpy()[reached],
+            'event_type': event_type,
+            'channel': funnel_df['channel'].to_numpy()[reached],
+            'device': funnel_df['device'].to_numpy()[reached],
+            'purchase_value': funnel_df['purchase_value'].to_numpy()[reached] if event_type == 'purchase' else np.nan,
+            'stage': stage
+        }))
+    events = pd.concat(frames, ignore_index=True).sort_values(['timestamp', 'stage'], kind='stable')
+    return events[EVENT_COLUMNS].reset_index(drop=True)
+
+
+def spill_events(events_df, spill_dir):
+    """Append a chunk's events to one headerless CSV bucket per event day"""
+    os.makedirs(spill_dir, exist_ok=True)
+    days = events_df['timestamp'].to_numpy().astype('datetime64[D]')
+    for day, day_df in events_df.groupby(days, sort=False):
+        day_df.to_csv(os.path.join(spill_dir, f'day={day}.csv'), mode='a', header=False, index=False)
+
+
+def merge_event_spills(spill_dir, path):
+    """Sort each day bucket and concatenate them in day order into one time-ordered log
+
+    Only one day of events is in memory at a time. Rows are kept as text, so
+    values are written back exactly as spilled. Returns the number of events.
+    """
+    stage_order = {event_type: stage for stage, event_type in enumerate(EVENT_TYPES)}
+    pd.DataFrame(columns=EVENT_COLUMNS).to_csv(path, index=False)
+    total = 0
+    for bucket in sorted(glob.glob(os.path.join(spill_dir, 'day=*.csv'))):
+        day_df = pd.read_csv(bucket, names=EVENT_COLUMNS, header=None, dtype=str, keep_default_na=False)
+        # ISO timestamps sort correctly as text; ties go by stage, then spill (user) order
+        day_df = day_df.assign(stage=day_df['event_type'].map(stage_order))
+        day_df = day_df.sort_values(['timestamp', 'stage'], kind='stable')[EVENT_COLUMNS]
+        day_df.to_csv(path, mode='a', header=False, index=False)
+        total += len(day_df)
+    shutil.rmtree(spill_dir)
+    return total
+
+
+# ============================================================================
+# LOADERS
+# ============================================================================
+
+def default_data_path():
+    """Most recently written marketing_funnel_data file or partition directory"""
+    candidates = [f'{DATA_BASENAME}.{fmt}' for fmt in DATA_FORMATS] + [DATA_BASENAME]
+    existing = [path for path in candidates if os.path.exists(path)]
+    if not existing:
+        raise FileNotFoundError(f"No {DATA_BASENAME} data found - run: python 00_generate_data.py")
+    return max(existing, key=os.path.getmtime)
+
+
+def _read_file(path, columns=None):
+    """Read one data file in its native format, optionally only some columns"""
+    fmt = data_format(path)
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if fmt == 'feather':
+        return pd.read_feather(path, columns=columns)
+    parse_dates = [col for col in TIMESTAMP_COLUMNS if columns is None or col in columns]
+    return pd.read_csv(path, usecols=columns, parse_dates=parse_dates)
+
+
+def _source_files(path):
+    """Data files behind a path: the file itself, or every partition file in a directory"""
+    if not os.path.isdir(path):
+        return [path]
+    files = sorted(file for fmt in DATA_FORMATS for file in glob.glob(os.path.join(path, f'*.{fmt}')))
+    if not files:
+        raise FileNotFoundError(f"No partition files found in {path}/")
+    return files
+
+
+def _load_source(path, columns=None):
+    """Parse a data file or partition directory into the typed schema"""
+    files = _source_files(path)
+    if os.path.isdir(path):
+        # Partitions are split by cohort_month; user_id restores generation order
+        read_columns = None if columns is None else list(dict.fromkeys(['user_id'] + columns))
+        df = pd.concat([_read_file(file, read_columns) for file in files], ignore_index=True)
+        df = df.sort_values('user_id', key=lambda ids: ids.str[1:].astype(np.int64), ignore_index=True)
+        if columns is not None:
+            df = df[columns]
+    else:
+        df = _read_file(path, columns)
+    return apply_schema(df)
+
+
+# ============================================================================
+# INCREMENTAL READS
+# ============================================================================
+
+def _tail_digest(path, offset, block_size=1 << 16):
+    """SHA-256 of the block just before offset - a cheap check that a file was only appended to"""
+    with open(path, 'rb') as f:
+        f.seek(max(offset - block_size, 0))
+        return hashlib.sha256(f.read(min(offset, block_size))).hexdigest()
+
+
+def _read_csv_from(path, offset, columns=None):
+    """Complete CSV lines written after byte offset, and the offset just past them"""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]  # leave a partially written last line for the next run
+    names = header.decode().strip().split(',')
+    end = max(offset, len(header)) + len(data)
+    if not data:
+        return pd.DataFrame(columns=columns or names), end
+    parse_dates = [col for col in TIMESTAMP_COLUMNS if columns is None or col in columns]
+    df = pd.read_csv(io.BytesIO(data), names=names, header=None, usecols=columns, parse_dates=parse_dates)
+    return df, end
+
+
+def read_new_rows(path, columns, positions):
+    """Rows of a data source that were not read yet, with the updated read positions
+
+    positions maps each file to the offset and tail digest recorded when it was
+    last read ({} reads everything). CSV files are read from their recorded
+    offset, so in-place appends cost only the new bytes; columnar part files are
+    immutable and read once, when they first appear. Returns (None, None) when
+    a file was rewritten rather than appended to, as its old rows cannot be
+    told apart from new ones.
+    """
+    frames, updated = [], {}
+    for file in _source_files(path):
+        size = os.path.getsize(file)
+        known = positions.get(file)
+        if known is not None and (size < known['offset'] or
+                                  _tail_digest(file, known['offset']) != known['tail']):
+            return None, None
+        if known is not None and size == known['offset']:
+            updated[file] = known
+            continue
+
+        if data_format(file) == 'csv':
+            df, offset = _read_csv_from(file, known['offset'] if known else 0, columns)
+        elif known is None:
+            df, offset = _read_file(file, columns), size
+        else:
+            return None, None
+        frames.append(df)
+        updated[file] = {'offset': offset, 'tail': _tail_digest(file, offset)}
+
+    if not frames:
+        return apply_schema(pd.DataFrame(columns=columns)), updated
+    return apply_schema(pd.concat(frames, ignore_index=True)), updated
+
+
+def read_new_touchpoints(path, positions):
+    """Touchpoint log rows not read yet, with the updated read positions (see read_new_rows)"""
+    touchpoints, positions = read_new_rows(path, TOUCHPOINT_COLUMNS, positions)
+    if touchpoints is not None:
+        touchpoints['timestamp'] = pd.to_datetime(touchpoints['timestamp'])
+    return touchpoints, positions
+
+
+def load_event_log(path=None, columns=None):
+    """Load a stage event log (00_generate_data.py --layout events) with typed columns"""
+    path = path or f'{EVENTS_BASENAME}.csv'
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No event log at {path} - run: python 00_generate_data.py --layout events")
+    dtypes = {col: 'category' for col in ['event_type', 'channel', 'device']}
+    parse_dates = ['timestamp'] if columns is None or 'timestamp' in columns else []
+    return pd.read_csv(path, usecols=columns, dtype=dtypes, parse_dates=parse_dates)
+
+
+def load_touchpoints(path=None):
+    """Load a marketing touchpoint log (00_generate_data.py --touchpoints), one row per touch"""
+    path = path or f'{TOUCHPOINTS_BASENAME}.csv'
+    return pd.read_csv(path, dtype={'channel': 'category'}, parse_dates=['timestamp'])
+
+
+# ============================================================================
+# PARSED-DATA CACHE
+# ============================================================================
+
+# One pickle per column, so a projected load only touches the columns it needs
+CACHE_DIR = '.funnel_cache'
+
+
+def _file_digest(path, block_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(path):
+    """Stable, filesystem-safe name for a data source path"""
+    source_id = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+    return f'{os.path.basename(os.path.normpath(path))}-{source_id}'
+
+
+def _cache_dir(path):
+    """Cache directory for a source path"""
+    return os.path.join(CACHE_DIR, source_key(path))
+
+
+def _describe_files(files, previous=None):
+    """Size, mtime and hash of each source file, reusing hashes of unchanged files"""
+    previous = {entry['path']: entry for entry in (previous or [])}
+    described = []
+    for file in files:
+        stat = os.stat(file)
+        entry = {'path': file, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        known = previous.get(file)
+        if known and known['size'] == entry['size'] and known['mtime_ns'] == entry['mtime_ns']:
+            entry['sha256'] = known['sha256']
+        else:
+            entry['sha256'] = _file_digest(file)
+        described.append(entry)
+    return described
+
+
+def _write_manifest(cache_dir, manifest):
+    """Persist a cache manifest"""
+    with open(os.path.join(cache_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _valid_manifest(path, cache_dir):
+    """Manifest of an up-to-date cache for path, or None when missing or stale
+
+    Files whose size and mtime are unchanged are trusted without re-hashing; a
+    changed mtime only invalidates the cache if the content hash changed too.
+    """
+    manifest_file = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.exists(manifest_file):
+        return None
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest.get('pandas') != pd.__version__:
+        return None
+
+    current = _describe_files(_source_files(path), manifest['files'])
+    if [(e['path'], e['size'], e['sha256']) for e in current] != \
+       [(e['path'], e['size'], e['sha256']) for e in manifest['files']]:
+        return None
+
+    if current != manifest['files']:
+        # Touched but identical content: refresh mtimes so the next check is cheap
+        manifest['files'] = current
+        _write_manifest(cache_dir, manifest)
+    return manifest
+
+
+def _open_cache(path):
+    """Cache directory and manifest for path, starting a fresh cache when missing or stale"""
+    cache_dir = _cache_dir(path)
+    manifest = _valid_manifest(path, cache_dir)
+    if manifest is None:
+        clear_cache(cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest = {'source': path, 'pandas': pd.__version__,
+                    'files': _describe_files(_source_files(path)), 'columns': [], 'tables': []}
+    return cache_dir, manifest
+
+
+def _load_cached(path, columns):
+    """Load columns through the cache, parsing and storing only the columns it lacks"""
+    cache_dir, manifest = _open_cache(path)
+
+    wanted = FUNNEL_COLUMNS if columns is None else columns
+    missing = [col for col in wanted if col not in manifest['columns']]
+    parsed = _load_source(path, missing) if missing else None
+    for col in missing:
+        parsed[col].to_pickle(os.path.join(cache_dir, f'{col}.pkl'))
+    if missing:
+        manifest['columns'] += missing
+        _write_manifest(cache_dir, manifest)
+
+    return pd.DataFrame({col: parsed[col] if col in missing else
+                         pd.read_pickle(os.path.join(cache_dir, f'{col}.pkl')) for col in wanted})
+
+
+def load_derived_table(name, build, path=None, use_cache=True):
+    """Table derived from a data source by build(path), e.g. the funnel cube
+
+    The table is stored next to the source's cached columns and shares their
+    invalidation: it is rebuilt only after the source files change.
+    """
+    path = path or default_data_path()
+    if not use_cache:
+        return build(path)
+
+    cache_dir, manifest = _open_cache(path)
+    table_file = os.path.join(cache_dir, f'{name}.pkl')
+    if name in manifest.get('tables', []):
+        return pd.read_pickle(table_file)
+
+    table = build(path)
+    # build() may have cached columns meanwhile, so re-read the manifest
+    cache_dir, manifest = _open_cache(path)
+    table.to_pickle(table_file)
+    manifest.setdefault('tables', []).append(name)
+    _write_manifest(cache_dir, manifest)
+    return table
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """Remove cached parses (all of them by default)"""
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def load_funnel_data(path=None, columns=None, use_cache=True):
+    """Load marketing funnel data from a CSV/Parquet/Feather file or a partition directory
+
+    columns restricts the load to the columns an analysis actually uses, so I/O
+    and memory scale with the projection rather than the dataset width. CSV
+    sources are parsed once per column and served from a binary cache in
+    .funnel_cache/ until the source files change; pass use_cache=False to bypass
+    the cache. Columnar sources are already typed and are read directly.
+    """
+    path = path or default_data_path()
+    if columns is not None:
+        unknown = set(columns) - set(FUNNEL_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown funnel columns: {sorted(unknown)}")
+        columns = [col for col in FUNNEL_COLUMNS if col in columns]
+
+    if use_cache and any(data_format(file) == 'csv' for file in _source_files(path)):
+        return _load_cached(path, columns)
+    return _load_source(path, columns)
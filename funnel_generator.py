@@ -0,0 +1,375 @@
+"""
+Vectorized Marketing Funnel Data Generation Engine
+Author: Marketing Analytics Project
+Description: Array-based user session and funnel progression generation used by 00_generate_data.py
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from funnel_data import FUNNEL_COLUMNS
+
+try:
+    import pyarrow as pa
+except ImportError:  # Optional: only used for faster string columns
+    pa = None
+
+# ============================================================================
+# HELPER FUNCTIONS
+# ============================================================================
+
+SECONDS_PER_DAY = 86400
+
+# Funnel transitions in order: (BASE_RATES key, stage flag, timestamp, minutes column, exit stage if dropped)
+FUNNEL_TRANSITIONS = [
+    ('landing_to_signup', 'stage_2_signup', 'signup_timestamp', 'landing_to_signup_minutes', 'Landing'),
+    ('signup_to_product_view', 'stage_3_product_view', 'product_view_timestamp', 'signup_to_product_minutes', 'Signup'),
+    ('product_view_to_cart', 'stage_4_add_to_cart', 'add_to_cart_timestamp', 'product_to_cart_minutes', 'Product_View'),
+    ('cart_to_purchase', 'stage_5_purchase', 'purchase_timestamp', 'cart_to_purchase_minutes', 'Add_to_Cart')
+]
+
+EXIT_STAGES = ['Landing', 'Signup', 'Product_View', 'Add_to_Cart', 'Purchase']
+
+
+def _probabilities(weights):
+    """Normalize a list of sampling weights into probabilities"""
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def format_user_ids(first_user, num_users):
+    """Format user numbers as 'U000001'-style ids without a per-user Python loop"""
+    numbers = np.arange(first_user, first_user + num_users, dtype=np.int64)
+
+    # Ids keep the f'U{n:06d}' format, so they only grow past 6 digits when needed
+    widths = np.maximum(6, np.floor(np.log10(np.maximum(numbers, 1))).astype(np.int64) + 1)
+    offsets = np.zeros(num_users + 1, dtype=np.int64)
+    np.cumsum(widths + 1, out=offsets[1:])
+
+    # Numbers are ascending, so each id width occupies one contiguous block of rows
+    chars = np.empty(offsets[-1], dtype=np.uint8)
+    for width in np.unique(widths):
+        rows = np.flatnonzero(widths == width)
+        block = chars[offsets[rows[0]]:offsets[rows[-1] + 1]].reshape(-1, width + 1)
+        block[:, 0] = ord('U')
+        remaining = numbers[rows[0]:rows[-1] + 1].copy()
+        for pos in range(width, 0, -1):
+            block[:, pos] = remaining % 10 + ord('0')
+            remaining //= 10
+
+    if pa is not None:
+        # Zero-copy Arrow string column built straight from the character buffer
+        arrow_ids = pa.Array.from_buffers(pa.large_string(), num_users,
+                                          [None, pa.py_buffer(offsets), pa.py_buffer(chars)])
+        return pd.array(arrow_ids.cast(pa.string()), dtype=pd.StringDtype('pyarrow'))
+
+    text = chars.tobytes().decode('ascii')
+    return np.array([text[offsets[i]:offsets[i + 1]] for i in range(num_users)], dtype=object)
+
+
+# ============================================================================
+# USER SESSION GENERATION
+# ============================================================================
+
+def _segment_names(config):
+    """Category labels for each sampled user attribute, in config order"""
+    return {
+        'channel': list(config['channels'].keys()),
+        'device': list(config['devices']),
+        'age_group': list(config['age_groups']),
+        'location': list(config['locations'])
+    }
+
+
+def _segment_probabilities(config):
+    """Sampling probabilities for each sampled user attribute, in config order"""
+    channel_weights = [config['channels'][ch]['weight'] for ch in config['channels']]
+    return {
+        'channel': _probabilities(channel_weights),
+        'device': _probabilities(config['device_weights']),
+        'age_group': _probabilities(config['age_weights']),
+        'location': _probabilities(config['location_weights'])
+    }
+
+
+def _build_users(first_user, codes, offset_seconds, config):
+    """Assemble the users DataFrame from category codes and landing offsets (in seconds)"""
+    names = _segment_names(config)
+    start = np.datetime64(config['start_date'], 's')
+
+    channel_mult = np.array([config['channels'][ch]['conversion_multiplier'] for ch in names['channel']])
+    device_mult = np.array([config['device_conversion'][d] for d in names['device']])
+
+    return pd.DataFrame({
+        'user_id': format_user_ids(first_user, len(offset_seconds)),
+        'channel': pd.Categorical.from_codes(codes['channel'], categories=names['channel']),
+        'device': pd.Categorical.from_codes(codes['device'], categories=names['device']),
+        'age_group': pd.Categorical.from_codes(codes['age_group'], categories=names['age_group']),
+        'location': pd.Categorical.from_codes(codes['location'], categories=names['location']),
+        'landing_timestamp': start + offset_seconds.astype('timedelta64[s]'),
+        'cohort_week': offset_seconds // SECONDS_PER_DAY // 7,
+        'channel_mult': channel_mult[codes['channel']],
+        'device_mult': device_mult[codes['device']]
+    })
+
+
+def generate_users_vectorized(num_users, config, rng, first_user=1):
+    """Generate base user sessions with one array draw per attribute
+
+    Produces the same columns and marginal distributions as the per-user loop in
+    00_generate_data.py (channel, device, age_group, location, landing_timestamp,
+    cohort_week and the channel/device conversion multipliers).
+    """
+    codes = {segment: rng.choice(len(probs), size=num_users, p=probs)
+             for segment, probs in _segment_probabilities(config).items()}
+
+    # Landing timestamp: random day in range plus random second of day (both inclusive)
+    span_days = (config['end_date'] - config['start_date']).days
+    day_and_second = rng.integers([0, 0], [span_days + 1, SECONDS_PER_DAY + 1], size=(num_users, 2))
+    offset_seconds = day_and_second[:, 0] * SECONDS_PER_DAY + day_and_second[:, 1]
+
+    return _build_users(first_user, codes, offset_seconds, config)
+
+
+# ============================================================================
+# FUNNEL PROGRESSION
+# ============================================================================
+
+def draw_progression_inputs(num_users, config, rng):
+    """Draw every random input the funnel progression needs, one array per quantity"""
+    num_stages = len(FUNNEL_TRANSITIONS)
+    delay_bounds = np.array([config['stage_delay_minutes'][key] for key, *_ in FUNNEL_TRANSITIONS])
+
+    return {
+        'random_factor': rng.uniform(*config['random_factor_range'], size=(num_users, num_stages)),
+        'conversion_draw': rng.random((num_users, num_stages)),
+        'delay_minutes': rng.integers(delay_bounds[:, 0], delay_bounds[:, 1] + 1, size=(num_users, num_stages)),
+        'purchase_value': np.round(rng.lognormal(*config['purchase_value_lognormal'], size=num_users), 2)
+    }
+
+
+def _month_labels(timestamps):
+    """'%Y-%m' labels for datetime64 values as a categorical (one strftime per month)"""
+    month_numbers = timestamps.astype('datetime64[M]').astype(np.int64)
+    first_month = month_numbers.min() if len(month_numbers) else 0
+    last_month = month_numbers.max() if len(month_numbers) else -1
+    months = np.arange(first_month, last_month + 1).astype('datetime64[M]')
+    return pd.Categorical.from_codes(month_numbers - first_month, categories=months.astype(str))
+
+
+def progress_funnel(users_df, config, inputs):
+    """Advance all users through the funnel with masked array operations
+
+    Each BASE_RATES transition is a single Bernoulli draw over the users still in
+    the funnel. Output columns match the per-user loop in 00_generate_data.py.
+    """
+    num_users = len(users_df)
+    landing = users_df['landing_timestamp'].to_numpy().astype('datetime64[s]')
+    channel_mult = users_df['channel_mult'].to_numpy()
+    device_mult = users_df['device_mult'].to_numpy()
+    time_improvement = 1 + users_df['cohort_week'].to_numpy() * config['time_improvement_per_week']
+
+    funnel = {
+        'user_id': users_df['user_id'].array,
+        'channel': users_df['channel'].array,
+        'device': users_df['device'].array,
+        'age_group': users_df['age_group'].array,
+        'location': users_df['location'].array,
+        'cohort_week': users_df['cohort_week'].to_numpy(),
+        'cohort_month': _month_labels(landing),
+        'stage_1_landing': np.ones(num_users, dtype=np.int64),
+        'landing_timestamp': landing
+    }
+
+    active = np.ones(num_users, dtype=bool)
+    current_timestamp = landing.copy()
+    journey_minutes = np.zeros(num_users, dtype=np.int64)
+    exit_codes = np.zeros(num_users, dtype=np.int8)
+
+    for stage, (rate_key, flag_col, timestamp_col, minutes_col, _) in enumerate(FUNNEL_TRANSITIONS):
+        probability = np.minimum(
+            config['base_rates'][rate_key] * channel_mult * device_mult * time_improvement
+            * inputs['random_factor'][:, stage],
+            config['max_conversion_probability']
+        )
+        active &= inputs['conversion_draw'][:, stage] < probability
+
+        delay = np.where(active, inputs['delay_minutes'][:, stage], 0)
+        current_timestamp += delay.astype('timedelta64[m]')
+        journey_minutes += delay
+        exit_codes[active] = stage + 1
+
+        funnel[flag_col] = active.astype(np.int64)
+        funnel[timestamp_col] = np.where(active, current_timestamp, np.datetime64('NaT'))
+        funnel[minutes_col] = np.where(active, delay, np.nan)
+
+    funnel['exit_stage'] = pd.Categorical.from_codes(exit_codes, categories=EXIT_STAGES)
+    funnel['purchase_value'] = np.where(active, inputs['purchase_value'], np.nan)
+    funnel['total_journey_minutes'] = np.where(active, journey_minutes, np.nan)
+
+    return pd.DataFrame(funnel, columns=FUNNEL_COLUMNS)
+
+
+def progress_funnel_vectorized(users_df, config, rng):
+    """Draw progression inputs from rng and advance all users through the funnel"""
+    return progress_funnel(users_df, config, draw_progression_inputs(len(users_df), config, rng))
+
+
+# ============================================================================
+# COUNTER-BASED (RANDOM ACCESS) GENERATION
+# ============================================================================
+
+# Fixed block of uniforms consumed by every user, in this column order:
+# 4 segment draws, day, second, 4 x random_factor, 4 x conversion_draw,
+# 4 x delay_minutes, 2 x purchase value (Box-Muller), 2 spare.
+# Philox yields 4 values per counter step, so the block is a multiple of 4.
+UNIFORMS_PER_USER = 24
+
+
+def draw_user_uniforms(first_user, num_users, seed):
+    """Uniform draws for users first_user .. first_user + num_users - 1
+
+    Philox is counter-based: user k's block starts at a fixed counter offset, so
+    jumping to any user is O(1) and a user's draws never depend on other users.
+    """
+    bit_generator = np.random.Philox(seed)
+    bit_generator.advance((first_user - 1) * (UNIFORMS_PER_USER // 4))
+    return np.random.Generator(bit_generator).random((num_users, UNIFORMS_PER_USER))
+
+
+def _inverse_choice(probabilities, uniforms):
+    """Map uniforms to category codes through the cumulative distribution"""
+    cumulative = np.cumsum(probabilities)
+    return np.minimum(np.searchsorted(cumulative, uniforms, side='right'), len(probabilities) - 1)
+
+
+def generate_counter_shard(first_user, num_users, config, seed):
+    """Generate complete funnel rows for a user range from counter-based draws
+
+    Rows depend only on seed and each user's number, so any chunking, worker
+    count or single-user lookup yields identical records.
+    """
+    uniforms = draw_user_uniforms(first_user, num_users, seed)
+
+    codes = {segment: _inverse_choice(probs, uniforms[:, col])
+             for col, (segment, probs) in enumerate(_segment_probabilities(config).items())}
+
+    span_days = (config['end_date'] - config['start_date']).days
+    days = np.floor(uniforms[:, 4] * (span_days + 1)).astype(np.int64)
+    seconds = np.floor(uniforms[:, 5] * (SECONDS_PER_DAY + 1)).astype(np.int64)
+    users_df = _build_users(first_user, codes, days * SECONDS_PER_DAY + seconds, config)
+
+    factor_low, factor_high = config['random_factor_range']
+    delay_bounds = np.array([config['stage_delay_minutes'][key] for key, *_ in FUNNEL_TRANSITIONS])
+    mean, sigma = config['purchase_value_lognormal']
+    normal = np.sqrt(-2 * np.log1p(-uniforms[:, 18])) * np.cos(2 * np.pi * uniforms[:, 19])
+
+    inputs = {
+        'random_factor': factor_low + (factor_high - factor_low) * uniforms[:, 6:10],
+        'conversion_draw': uniforms[:, 10:14],
+        'delay_minutes': delay_bounds[:, 0] + np.floor(
+            uniforms[:, 14:18] * (delay_bounds[:, 1] - delay_bounds[:, 0] + 1)).astype(np.int64),
+        'purchase_value': np.round(np.exp(mean + sigma * normal), 2)
+    }
+    return progress_funnel(users_df, config, inputs)
+
+
+def generate_user(user_number, config, seed):
+    """Generate the funnel record of a single user in O(1), e.g. user_number=48213 for U048213"""
+    return generate_counter_shard(user_number, 1, config, seed).iloc[0]
+
+
+# ============================================================================
+# PRE-LANDING TOUCHPOINTS
+# ============================================================================
+
+def generate_touchpoints(funnel_df, config, rng):
+    """Marketing touchpoints of each user, ending with the landing session itself
+
+    Earlier touches (ads, emails, searches that did not lead to a session) are
+    drawn per user within the lookback window before landing. Purchasers get
+    more of them on average, and their channels lean towards channels with a
+    high conversion multiplier, so multi-touch models have a signal to find.
+    Returns one row per touch (user_id, timestamp, channel), ordered by user
+    and time.
+    """
+    num_users = len(funnel_df)
+    purchased = funnel_df['stage_5_purchase'].to_numpy() == 1
+    mean_touches = np.where(purchased, config['mean_prior_touches']['purchase'],
+                            config['mean_prior_touches']['no_purchase'])
+    counts = rng.poisson(mean_touches)
+    owner = np.repeat(np.arange(num_users), counts)
+
+    channels = list(config['channels'])
+    weights = np.array([settings['weight'] for settings in config['channels'].values()])
+    lifts = np.array([settings['conversion_multiplier'] for settings in config['channels'].values()])
+    uniforms = rng.random(len(owner))
+    prior_channels = np.where(purchased[owner],
+                              _inverse_choice(_probabilities(weights * lifts), uniforms),
+                              _inverse_choice(_probabilities(weights), uniforms))
+    landing = funnel_df['landing_timestamp'].to_numpy().astype('datetime64[s]')
+    seconds_before = rng.integers(1, config['touchpoint_lookback_days'] * SECONDS_PER_DAY, len(owner))
+
+    # Prior touches followed by the landing session, sorted by user then time
+    owner = np.concatenate([owner, np.arange(num_users)])
+    timestamps = np.concatenate([landing[owner[:len(seconds_before)]] - seconds_before.astype('timedelta64[s]'),
+                                 landing])
+    channel_codes = np.concatenate([prior_channels,
+                                    pd.Categorical(funnel_df['channel'], categories=channels).codes])
+    order = np.lexsort((timestamps, owner))
+    return pd.DataFrame({
+        'user_id': funnel_df['user_id'].to_numpy()[owner[order]],
+        'timestamp': timestamps[order],
+        'channel': pd.Categorical.from_codes(channel_codes[order], categories=channels)
+    })
+
+
+# ============================================================================
+# SHARDED / CHUNKED GENERATION
+# ============================================================================
+
+def generate_shard(first_user, num_users, config, seed_sequence):
+    """Generate one shard of complete funnel rows from its own independent random stream"""
+    rng = np.random.default_rng(seed_sequence)
+    users_df = generate_users_vectorized(num_users, config, rng, first_user=first_user)
+    return progress_funnel_vectorized(users_df, config, rng)
+
+
+def generate_funnel_chunks(num_users, config, seed, chunk_size, workers=1, first_user=1,
+                           rng_mode='sequential'):
+    """Yield complete funnel DataFrames of at most chunk_size users each, in user order
+
+    The user_id range is split into fixed-size shards. With rng_mode='sequential'
+    each shard gets its own stream spawned from one root SeedSequence, so the rows
+    depend only on seed and chunk_size - never on the number of workers. With
+    rng_mode='counter' rows depend only on seed (see generate_counter_shard).
+    With workers > 1 shards are generated in a process pool; at most 2 * workers
+    shards are in flight, so peak memory stays bounded by chunk_size.
+    """
+    end_user = first_user + num_users
+    shard_starts = list(range(first_user, end_user, chunk_size))
+    if rng_mode == 'counter':
+        shard_function = generate_counter_shard
+        shard_seeds = [seed] * len(shard_starts)
+    else:
+        shard_function = generate_shard
+        shard_seeds = np.random.SeedSequence(seed).spawn(len(shard_starts))
+    shards = [(start, min(chunk_size, end_user - start), config, shard_seed)
+              for start, shard_seed in zip(shard_starts, shard_seeds)]
+
+    if workers <= 1:
+        for shard in shards:
+            yield shard_function(*shard)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for shard in shards:
+            pending.append(pool.submit(shard_function, *shard))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,185 @@
+"""
+Marketing Mix Model
+Author: Marketing Analytics Project
+Description: Weekly channel spend/revenue series, geometric adstock, Hill saturation and fast batched model fitting
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+
+from funnel_budget import session_cost
+from funnel_metrics import rollup_cube
+
+# ============================================================================
+# WEEKLY SERIES
+# ============================================================================
+
+def weekly_channel_series(cube, cpa_by_channel=None):
+    """Weekly spend per channel and total weekly revenue from the funnel cube
+
+    Spend is sessions x cost per session (CPA_BY_CHANNEL by default), bucketed
+    by cohort_week. Returns (spend: weeks x channels DataFrame, revenue: Series).
+    """
+    weekly = rollup_cube(cube, ['cohort_week', 'channel'], ['sessions', 'purchase_value']).reset_index()
+    weekly['spend'] = weekly['sessions'] * session_cost(weekly['channel'], cpa_by_channel)
+    spend = weekly.pivot_table(index='cohort_week', columns='channel', values='spend', aggfunc='sum',
+                               fill_value=0, observed=True)
+    revenue = weekly.groupby('cohort_week')['purchase_value'].sum().reindex(spend.index, fill_value=0)
+    return spend, revenue
+
+
+# ============================================================================
+# MEDIA TRANSFORMS
+# ============================================================================
+
+def geometric_adstock(spend, decay):
+    """Carry-over of spend into later weeks: adstock[t] = spend[t] + decay * adstock[t - 1]
+
+    spend has weeks on axis 0 and decay broadcasts against one week of it, so
+    with a trailing axis on spend one call filters every channel under every
+    candidate decay. The recursion runs once per week, each step vectorized
+    across all series.
+    """
+    spend = np.asarray(spend, dtype=np.float64)
+    decay = np.asarray(decay, dtype=np.float64)
+    adstock = np.empty((len(spend),) + np.broadcast_shapes(spend.shape[1:], decay.shape))
+    carry = np.zeros(adstock.shape[1:])
+    for week in range(len(spend)):
+        carry = spend[week] + decay * carry
+        adstock[week] = carry
+    return adstock
+
+
+def hill_saturation(x, half_saturation, shape):
+    """Hill curve: share of the maximum effect reached at media level x (0.5 at half_saturation)"""
+    x = np.maximum(x, 0)
+    return x ** shape / (x ** shape + half_saturation ** shape)
+
+
+# ============================================================================
+# FITTING
+# ============================================================================
+
+# Candidate non-linear parameters, tried for each channel
+DECAY_GRID = np.linspace(0.0, 0.8, 9)
+HALF_SATURATION_GRID = np.array([0.25, 0.5, 1.0, 2.0, 4.0])   # x the channel's mean adstocked spend
+SHAPE_GRID = np.array([0.5, 1.0, 2.0])
+
+
+def _candidate_features(spend):
+    """Saturated adstock of every channel under every (decay, half_saturation, shape) candidate
+
+    Returns (features: channels x candidates x weeks, candidate parameter table,
+    half-saturation spend level: channels x candidates).
+    """
+    adstock = geometric_adstock(spend[:, :, None], DECAY_GRID)                     # weeks x channels x decays
+    levels = np.maximum(adstock.mean(axis=0), np.finfo(float).tiny)                # channels x decays
+    half_saturation = levels[:, :, None] * HALF_SATURATION_GRID                    # channels x decays x halfs
+    features = hill_saturation(adstock[:, :, :, None, None], half_saturation[None, :, :, :, None],
+                               SHAPE_GRID)                                          # weeks x ch x d x h x s
+    num_weeks, num_channels = spend.shape
+    decay, half, shape = np.meshgrid(np.arange(len(DECAY_GRID)), np.arange(len(HALF_SATURATION_GRID)),
+                                     np.arange(len(SHAPE_GRID)), indexing='ij')
+    candidates = pd.DataFrame({'decay': DECAY_GRID[decay.ravel()],
+                               'half_saturation_level': HALF_SATURATION_GRID[half.ravel()],
+                               'shape': SHAPE_GRID[shape.ravel()]})
+    half_saturation = np.repeat(half_saturation[:, :, :, None], len(SHAPE_GRID), axis=3).reshape(num_channels, -1)
+    return features.reshape(num_weeks, num_channels, -1).transpose(1, 2, 0), candidates, half_saturation
+
+
+def _fit_features(features, revenue, sweeps=3):
+    """Choose one candidate per channel and fit intercept + coefficients by least squares
+
+    Coordinate descent: for one channel at a time, every candidate is scored
+    at once - the candidate designs are stacked and all their normal
+    equations solved in one batched call, with the other channels held at
+    their current choice. Candidates needing a negative media coefficient are
+    skipped. Returns (chosen candidate per channel, intercept, coefficients).
+    """
+    num_channels, num_candidates, num_weeks = features.shape
+    choice = np.zeros(num_channels, dtype=np.int64)
+    ridge = 1e-9 * np.eye(num_channels + 1)
+
+    for _ in range(sweeps):
+        previous = choice.copy()
+        for channel in range(num_channels):
+            chosen = features[np.arange(num_channels), choice]                        # channels x weeks
+            designs = np.broadcast_to(np.r_[np.ones((1, num_weeks)), chosen].T,
+                                      (num_candidates, num_weeks, num_channels + 1)).copy()
+            designs[:, :, channel + 1] = features[channel]
+            gram = designs.transpose(0, 2, 1) @ designs + ridge * np.trace(designs[0].T @ designs[0])
+            coefficients = np.linalg.solve(gram, (designs.transpose(0, 2, 1) @ revenue)[:, :, None])
+            errors = (((designs @ coefficients)[:, :, 0] - revenue) ** 2).sum(axis=1)
+            coefficients = coefficients[:, :, 0]
+            feasible = (coefficients[:, 1:] >= 0).all(axis=1)
+            choice[channel] = np.where(feasible, errors, np.inf).argmin() if feasible.any() else errors.argmin()
+        if (choice == previous).all():
+            break
+
+    # Final coefficients with every media coefficient (and the base) non-negative
+    design = np.r_[np.ones((1, num_weeks)), features[np.arange(num_channels), choice]].T
+    coefficients = nnls(design, revenue)[0]
+    return choice, coefficients[0], coefficients[1:]
+
+
+def fit_mmm(spend, revenue, sweeps=3):
+    """Marketing mix model: revenue = base + sum of coefficient x Hill(adstock(spend)) per channel
+
+    spend is a weeks x channels DataFrame, revenue the matching weekly
+    Series (weekly_channel_series). Adstock decay, Hill half-saturation and
+    shape come from a grid per channel, searched by batched least squares.
+    Returns a dict: params (one row per channel with decay, half_saturation,
+    shape, coefficient, spend, contribution and roi), intercept, fitted
+    revenue and r_squared.
+    """
+    return _fit_prepared(spend, revenue, _candidate_features(spend.to_numpy(dtype=np.float64)), sweeps)
+
+
+def _fit_prepared(spend, revenue, prepared, sweeps):
+    """fit_mmm with the candidate features already built"""
+    features, candidates, half_saturation = prepared
+    y = np.asarray(revenue, dtype=np.float64)
+    choice, intercept, coefficients = _fit_features(features, y, sweeps)
+
+    chosen = features[np.arange(len(choice)), choice]
+    contribution = coefficients[:, None] * chosen
+    fitted = intercept + contribution.sum(axis=0)
+    total_spend = spend.to_numpy(dtype=np.float64).sum(axis=0)
+    params = candidates.iloc[choice][['decay', 'shape']].reset_index(drop=True)
+    params.insert(1, 'half_saturation', half_saturation[np.arange(len(choice)), choice])
+    params['coefficient'] = coefficients
+    params['spend'] = total_spend
+    params['contribution'] = contribution.sum(axis=1)
+    params['roi'] = np.divide(params['contribution'], total_spend, out=np.zeros(len(choice)), where=total_spend > 0)
+    params.index = spend.columns
+
+    total_variance = ((y - y.mean()) ** 2).sum()
+    return {
+        'params': params,
+        'intercept': intercept,
+        'fitted': pd.Series(fitted, index=spend.index, name='fitted'),
+        'r_squared': 1 - ((y - fitted) ** 2).sum() / total_variance if total_variance > 0 else 0.0
+    }
+
+
+def bootstrap_mmm(spend, revenue, num_bootstrap=200, seed=42, sweeps=3):
+    """Refit the model on residual-bootstrap replicates of revenue
+
+    Weekly residuals of the full fit are resampled onto the fitted series, so
+    the week order that adstock depends on is kept. The candidate features
+    depend only on spend and are built once for every refit. Returns
+    (full fit, replicates: one row per refit and channel with decay,
+    contribution and roi).
+    """
+    prepared = _candidate_features(spend.to_numpy(dtype=np.float64))
+    fit = _fit_prepared(spend, revenue, prepared, sweeps)
+    residuals = np.asarray(revenue, dtype=np.float64) - fit['fitted'].to_numpy()
+    rng = np.random.default_rng(seed)
+
+    replicates = []
+    for replicate in range(num_bootstrap):
+        resampled = fit['fitted'].to_numpy() + rng.choice(residuals, size=len(residuals), replace=True)
+        params = _fit_prepared(spend, resampled, prepared, sweeps)['params']
+        replicates.append(params[['decay', 'contribution', 'roi']].assign(replicate=replicate))
+    return fit, pd.concat(replicates).rename_axis('channel').reset_index()
@@ -0,0 +1,107 @@
+"""
+Sequence Funnel Evaluator
+Author: Marketing Analytics Project
+Description: Custom ordered funnels with a conversion window over a stage event log (windowFunnel-style)
+"""
+
+import numpy as np
+import pandas as pd
+
+from funnel_data import EVENT_TYPES
+
+# ============================================================================
+# FUNNEL DEFINITIONS
+# ============================================================================
+
+def parse_funnel(spec):
+    """Stages from a spec like 'landing,product_view,add_to_cart|purchase'
+
+    Stages are comma-separated; '|' lists alternative event types for one stage.
+    Raises ValueError naming the stage when an event type is empty or not one
+    of EVENT_TYPES.
+    """
+    stages = [[name.strip() for name in stage.split('|')] for stage in spec.split(',')]
+    for number, stage in enumerate(stages, start=1):
+        unknown = [name for name in stage if name not in EVENT_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown event type(s) {', '.join(repr(name) for name in unknown)} in funnel step "
+                             f"{number} ('{'|'.join(stage)}'); valid event types: {', '.join(EVENT_TYPES)}")
+    return stages
+
+
+def stage_label(stage):
+    """Display name of a stage (alternatives joined with ' or ')"""
+    return ' or '.join(stage) if not isinstance(stage, str) else stage
+
+
+# ============================================================================
+# WINDOWED EVALUATION
+# ============================================================================
+
+def window_funnel(events_df, stages, window, dimensions=()):
+    """Deepest stage of an ordered funnel each user reached within a conversion window
+
+    A chain starts at an event of the first stage and advances one stage per
+    later event of the next stage, as long as that event is within window of
+    the chain's start; each stage advances the most recent chain of the stage
+    before it, as windowFunnel does. Each stage is one vectorized pass over
+    the events sorted by user and time, so the cost is O(stages x events)
+    with no per-user Python work.
+
+    stages is a list of event types or lists of alternative event types;
+    window is anything pd.Timedelta accepts ('24h', 90 minutes, ...). Returns
+    one row per user with 'level' (0 = never entered the funnel) and the given
+    dimensions taken from the user's first event. An event type that never
+    occurs in events_df matches nothing, so its stage reaches 0 users.
+    """
+    stages = [[stage] if isinstance(stage, str) else list(stage) for stage in stages]
+    window_ns = pd.Timedelta(window).value
+
+    codes, users = pd.factorize(events_df['user_id'])
+    timestamps = events_df['timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64)
+    order = np.lexsort((timestamps, codes))  # stable: simultaneous events keep log order
+    codes, timestamps = codes[order], timestamps[order]
+
+    # Match stages on small integer codes rather than event type strings
+    type_codes, type_names = pd.factorize(events_df['event_type'])
+    event_types = type_codes[order]
+    stage_codes = [type_names.get_indexer(event_names) for event_names in stages]
+    stages = [event_codes[event_codes >= 0] for event_codes in stage_codes]  # -1 = absent from the log
+
+    positions = np.arange(len(codes))
+    first_event = np.r_[True, codes[1:] != codes[:-1]]
+    user_start = np.maximum.accumulate(np.where(first_event, positions, 0))
+
+    levels = np.zeros(len(users), dtype=np.int8)
+    reached = np.isin(event_types, stages[0])
+    chain_start = np.where(reached, timestamps, 0)
+    levels[codes[reached]] = 1
+
+    for depth, event_names in enumerate(stages[1:], start=2):
+        # Latest event of the same user, strictly earlier, that reached the previous stage
+        latest = np.maximum.accumulate(np.where(reached, positions, -1))
+        previous = np.r_[-1, latest[:-1]]
+        linked = previous >= user_start
+        start = chain_start[previous]
+
+        reached = linked & np.isin(event_types, event_names) & (timestamps - start <= window_ns)
+        if not reached.any():
+            break
+        chain_start = np.where(reached, start, 0)
+        levels[codes[reached]] = depth
+
+    result = pd.DataFrame({'level': levels}, index=pd.Index(users, name='user_id'))
+    for dim in dimensions:
+        result[dim] = events_df[dim].to_numpy()[order][first_event]
+    return result
+
+
+def sequence_funnel_report(levels, stages):
+    """Users reaching each stage with overall and stage-to-stage conversion (OVERALL FUNNEL layout)"""
+    reached = np.bincount(levels, minlength=len(stages) + 1)[::-1].cumsum()[::-1][1:]
+    report = pd.DataFrame({'Stage': [stage_label(stage) for stage in stages], 'Users': reached})
+    entered = reached[0] if reached[0] > 0 else np.nan
+    report['Overall Conv Rate'] = report['Users'] / entered * 100
+    report['Stage Conv Rate'] = (report['Users'] / report['Users'].shift(fill_value=reached[0]).replace(0, np.nan)) * 100
+    report['Drop-off Rate'] = 100 - report['Stage Conv Rate']
+    return report
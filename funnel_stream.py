@@ -0,0 +1,188 @@
+"""
+Streaming Funnel Engine
+Author: Marketing Analytics Project
+Description: Windowed funnel and channel metrics over a live, time-ordered stage event feed
+"""
+
+import socket
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from funnel_data import EVENT_COLUMNS, EVENT_TYPES
+from funnel_metrics import add_rates
+
+# ============================================================================
+# EVENT SOURCES
+# ============================================================================
+
+EPOCH = datetime(1970, 1, 1)
+STAGE_INDEX = {event_type: stage for stage, event_type in enumerate(EVENT_TYPES)}
+
+# Per-stage counts reported for every window, in funnel order
+STAGE_METRICS = ['Sessions', 'Signups', 'Product Views', 'Add to Carts', 'Purchases']
+
+
+def parse_event(line):
+    """(timestamp, user_id, event_type, channel, purchase_value) from one event line, None for a header
+
+    Lines are CSV in EVENT_COLUMNS order; purchase_value is empty except on purchases.
+    """
+    fields = line.rstrip('\r\n').split(',')
+    if fields[0] == EVENT_COLUMNS[0]:
+        return None
+    value = fields[5] if len(fields) > 5 else ''
+    return datetime.fromisoformat(fields[0]), fields[1], fields[2], fields[3], float(value) if value else 0.0
+
+
+def tail_events(path, follow=False, poll_seconds=1.0):
+    """Event lines of a file; with follow, keep waiting for appended lines like tail -f"""
+    with open(path) as f:
+        partial = ''
+        while True:
+            line = f.readline()
+            if line:
+                partial += line
+                if partial.endswith('\n'):
+                    yield partial
+                    partial = ''
+            elif follow:
+                time.sleep(poll_seconds)
+            else:
+                if partial:
+                    yield partial
+                return
+
+
+def socket_events(port, host='127.0.0.1'):
+    """Event lines sent to a local TCP socket, one connection after another"""
+    with socket.create_server((host, port)) as server:
+        while True:
+            connection, _ = server.accept()
+            with connection, connection.makefile('r') as lines:
+                yield from lines
+
+
+# ============================================================================
+# WINDOWED FUNNEL STATE
+# ============================================================================
+
+class StreamingFunnel:
+    """Per-user stage state and windowed funnel counts over time-ordered stage events
+
+    A session belongs to every window containing its landing time; windows are
+    window_minutes long and start every slide_minutes (tumbling when equal).
+    Counts are kept per slide-length pane and summed when a window is emitted.
+    A window is emitted once the stream is journey_timeout_minutes past its
+    end, when none of its journeys can still advance. Users leave the state as
+    soon as they purchase or stay idle for longer than the journey timeout, so
+    memory is bounded by the number of open journeys, not the stream length.
+    """
+
+    def __init__(self, window_minutes=60, slide_minutes=None, journey_timeout_minutes=24 * 60):
+        slide_minutes = slide_minutes or window_minutes
+        if window_minutes % slide_minutes:
+            raise ValueError("window_minutes must be a multiple of slide_minutes")
+        self.slide = timedelta(minutes=slide_minutes)
+        self.panes_per_window = window_minutes // slide_minutes
+        self.timeout = timedelta(minutes=journey_timeout_minutes)
+
+        self.users = OrderedDict()  # user_id -> [pane, channel, stage reached, last event], oldest first
+        self.panes = {}             # pane -> {channel: [count per stage..., revenue]}
+        self.watermark = None
+        self.next_window = None     # first pane of the next window to emit
+        self.ignored_events = 0
+
+    def _pane(self, timestamp):
+        return (timestamp - EPOCH) // self.slide
+
+    def _window_end(self, window):
+        return EPOCH + (window + self.panes_per_window) * self.slide
+
+    def process(self, timestamp, user_id, event_type, channel, purchase_value=0.0):
+        """Apply one event and return the metrics of any windows it completes"""
+        self.watermark = timestamp if self.watermark is None else max(self.watermark, timestamp)
+        stage = STAGE_INDEX.get(event_type)
+
+        if stage == 0:
+            pane = self._pane(timestamp)
+            if self.next_window is None:
+                self.next_window = pane - self.panes_per_window + 1
+            if pane < self.next_window:
+                # Late landing: every window containing it was already emitted
+                self.ignored_events += 1
+            else:
+                self.users[user_id] = [pane, channel, 0, timestamp]
+                self.users.move_to_end(user_id)
+                self._count(pane, channel, 0)
+        else:
+            state = self.users.get(user_id)
+            if stage is None or state is None or stage <= state[2]:
+                # Unknown event type, journey already evicted, or a repeated stage
+                self.ignored_events += 1
+            elif state[0] < self.next_window:
+                # Late stage event: every window containing the landing was
+                # already emitted, so the journey can no longer be counted
+                self.ignored_events += 1
+                del self.users[user_id]
+            else:
+                state[2], state[3] = stage, timestamp
+                self.users.move_to_end(user_id)
+                self._count(state[0], state[1], stage, purchase_value)
+                if stage == len(EVENT_TYPES) - 1:
+                    del self.users[user_id]  # journey complete
+
+        self._expire()
+        return self._emit(self.watermark - self.timeout)
+
+    def flush(self):
+        """Metrics of every window still open, e.g. at the end of a finite feed"""
+        return self._emit(None)
+
+    def _count(self, pane, channel, stage, purchase_value=0.0):
+        counts = self.panes.setdefault(pane, {}).setdefault(channel, [0] * len(EVENT_TYPES) + [0.0])
+        counts[stage] += 1
+        counts[-1] += purchase_value
+
+    def _expire(self):
+        """Evict users idle for longer than the journey timeout (oldest activity first)"""
+        horizon = self.watermark - self.timeout
+        while self.users and next(iter(self.users.values()))[3] < horizon:
+            self.users.popitem(last=False)
+
+    def _emit(self, horizon):
+        """Metrics of windows ending at or before horizon (all windows when None)"""
+        emitted = []
+        while self.panes:
+            # Skip over idle stretches with no sessions at all
+            self.next_window = max(self.next_window, min(self.panes) - self.panes_per_window + 1)
+            if horizon is not None and self._window_end(self.next_window) > horizon:
+                break
+            window_panes = range(self.next_window, self.next_window + self.panes_per_window)
+            if any(pane in self.panes for pane in window_panes):
+                emitted.append(self._window_metrics(self.next_window))
+            self.next_window += 1
+            self.panes.pop(self.next_window - 1, None)
+        return emitted
+
+    def _window_metrics(self, window):
+        """OVERALL FUNNEL and CHANNEL metrics for one window, one row per channel plus 'All'"""
+        totals = {}
+        for pane in range(window, window + self.panes_per_window):
+            for channel, counts in self.panes.get(pane, {}).items():
+                total = totals.setdefault(channel, [0] * len(counts))
+                for i, count in enumerate(counts):
+                    total[i] += count
+
+        metrics = pd.DataFrame.from_dict(totals, orient='index', columns=STAGE_METRICS + ['Revenue'])
+        metrics.loc['All'] = metrics.sum()
+        metrics[STAGE_METRICS] = metrics[STAGE_METRICS].astype('int64')
+        metrics = add_rates(metrics)
+        for previous, stage in zip(STAGE_METRICS, STAGE_METRICS[1:]):
+            metrics[f'{stage} Drop-off'] = (1 - metrics[stage] / metrics[previous].where(metrics[previous] > 0)) * 100
+
+        metrics.insert(0, 'window_start', EPOCH + window * self.slide)
+        metrics.insert(1, 'window_end', self._window_end(window))
+        return metrics.rename_axis('Channel').reset_index()
@@ -0,0 +1,31 @@
+"""Regression tests for the streaming funnel engine (funnel_stream.py)"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from funnel_stream import StreamingFunnel
+
+
+def test_late_stage_event_after_window_emitted():
+    engine = StreamingFunnel(window_minutes=60, journey_timeout_minutes=30)
+    assert engine.process(datetime(2024, 1, 1, 0, 10), 'U1', 'landing', 'Email') == []
+    engine.process(datetime(2024, 1, 1, 1, 20), 'U1', 'signup', 'Email')
+
+    # Advancing the stream emits the 00:00 window while U1 is still open
+    emitted = engine.process(datetime(2024, 1, 1, 1, 40), 'U2', 'landing', 'Direct')
+    assert len(emitted) == 1 and 'U1' in engine.users
+
+    # U1's next stage belongs to the emitted window: ignored, no pane revived
+    assert engine.process(datetime(2024, 1, 1, 1, 45), 'U1', 'product_view', 'Email') == []
+    assert engine.ignored_events == 1
+    assert 'U1' not in engine.users
+    assert min(engine.panes) >= engine.next_window
+
+    windows = engine.flush()
+    assert len(windows) == 1
+    overall = windows[0].set_index('Channel').loc['All']
+    assert overall['Sessions'] == 1 and overall['Signups'] == 0
+    assert engine.panes == {}